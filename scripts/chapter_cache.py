@@ -0,0 +1,107 @@
+# This module stores the transformed chapters of `merge_by_toc.py` in an on-disk cache, so a rebuild only transforms the changed chapters.
+# A cache key is the hash of the chapter content plus a hash of everything else that the transformed chapter depends on: `variables.json`,
+# which CustomContent blocks the platform and plan keep, the heading level, the anchors of the headings in the link table, and the
+# transformer sources. The rest of the link table is checked when a chapter is looked up: each entry records the link lookups that the
+# chapter made, and it is only used if the current link table gives the same answers, so editing a heading in one chapter does not
+# invalidate the chapters that do not link to it. A chapter that is in several TOC files can link differently in each, so an entry keeps
+# up to `MAX_ALTERNATIVES` chapters with different lookups.
+# The cache uses the file format and the eviction of `lint_cache.py`: the least recently used entries are removed above `max_entries`.
+#
+#     cache = chapter_cache.ChapterCache.load("chapter-cache.json")
+#     variant = (chapter_cache.variables_hash(variables), signature, level, anchors)
+#     chapter = cache.chapter(chapter_cache.content_hash(text), variant, table)  # None if it must be transformed
+#     cache.put_chapter(chapter_cache.content_hash(text), variant, lookups, chapter)
+#     cache.save()
+
+import ast
+import hashlib
+import json
+import os
+import time
+
+import lint_cache
+
+DEFAULT_MAX_ENTRIES = 10000
+MAX_ALTERNATIVES = 8
+# The module that transforms the chapters. It and the modules of this directory that it imports define the transformed chapters.
+TRANSFORM_MODULE = "merge_by_toc.py"
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def variables_hash(variables):
+    return hashlib.sha1(json.dumps(variables, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Return the file names of `source` and of the modules in its directory that it imports, directly or through other such modules.
+def module_sources(source):
+    here = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    todo = [source]
+    while todo:
+        name = todo.pop()
+        if name in found:
+            continue
+        found.add(name)
+        with open(os.path.join(here, name), "r", encoding="utf-8") as fp:
+            tree = ast.parse(fp.read(), name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                filename = module.split(".")[0] + ".py"
+                if os.path.isfile(os.path.join(here, filename)):
+                    todo.append(filename)
+    return sorted(found)
+
+
+# Return a hash of the transformer. It changes whenever the transformer sources change.
+def transform_version():
+    digest = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for source in module_sources(TRANSFORM_MODULE):
+        with open(os.path.join(here, source), "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+class ChapterCache(lint_cache.LintCache):
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+        self.version = transform_version()
+
+    # `variant` is (variables hash, filter signature, level, anchors), everything but the content and the link table.
+    def _key(self, digest, variant):
+        return digest + ":" + hashlib.sha1(json.dumps([self.version] + list(variant)).encode("utf-8")).hexdigest()
+
+    # A value is a list of [lookups, chapter], where the lookups are [file, anchor, result].
+    def _valid_value(self, value):
+        return isinstance(value, list) and all(
+            isinstance(item, list) and len(item) == 2 and isinstance(item[0], list) and isinstance(item[1], str)
+            and all(isinstance(lookup, list) and len(lookup) == 3 for lookup in item[0]) for item in value)
+
+    # Return the cached chapter if all of its links resolve the same in `table`, otherwise None.
+    def chapter(self, digest, variant, table):
+        entry = self.entries.get(self._key(digest, variant))
+        for lookups, chapter in entry[1] if entry is not None else ():
+            if all(table.resolve(name, anchor) == result for name, anchor, result in lookups):
+                self.hits += 1
+                entry[0] = time.time()
+                self._dirty = True
+                return chapter
+        self.misses += 1
+        return None
+
+    # `lookups` maps the (file, anchor) lookups of the chapter in the link table to their results.
+    def put_chapter(self, digest, variant, lookups, chapter):
+        entry = self.entries.get(self._key(digest, variant))
+        alternatives = entry[1][-(MAX_ALTERNATIVES - 1):] if entry is not None else []
+        alternatives.append([[[name, anchor, result] for (name, anchor), result in lookups.items()], chapter])
+        self.put(digest, variant, alternatives)
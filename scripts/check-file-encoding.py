@@ -28,30 +28,36 @@
 
 # This file is originally hosted at https://github.com/CharLotteiu/pingcap-docs-checks/blob/main/check-file-encoding.py.
 
-import sys, os, codecs
-
-# Convert the file encoding to the default UTF-8 without BOM.
-def check_BOM(filename):
-    BUFSIZE = 4096
-    BOMLEN = len(codecs.BOM_UTF8)
-
-    with open(filename, "r+b") as fp:
-        chunk = fp.read(BUFSIZE)
-        if chunk.startswith(codecs.BOM_UTF8):
-            i = 0
-            chunk = chunk[BOMLEN:]
-            while chunk:
-                fp.seek(i)
-                fp.write(chunk)
-                i += len(chunk)
-                fp.seek(BOMLEN, os.SEEK_CUR)
-                chunk = fp.read(BUFSIZE)
-            fp.seek(-BOMLEN, os.SEEK_CUR)
-            fp.truncate()
-            print("\n" + filename + ": this file's encoding has been converted to UTF-8 without BOM to avoid broken metadata display.")
+import argparse, os
+
+import file_runner
+import lint_rules
 
 if __name__ == "__main__":
 
-    for filename in sys.argv[1:]:
-        if os.path.isfile(filename):
-            check_BOM(filename)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert files to UTF-8 without BOM.")
+    parser.add_argument("--all", action="store_true",
+                        help="check all Markdown files under the current directory and print a summary of the converted files")
+    file_runner.add_jobs_argument(parser)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    if args.all:
+        filenames = file_runner.find_markdown_files()
+    else:
+        filenames = [filename for filename in args.files if os.path.isfile(filename)]
+
+    # Only the first three bytes are read unless the file has a BOM.
+    results = file_runner.map_files(lint_rules.remove_BOM, filenames, args.jobs)
+    converted = [filename for filename, result in zip(filenames, results) if result]
+
+    if args.all:
+        if converted:
+            print("Converted " + str(len(converted)) + " of " + str(len(filenames)) + " files to UTF-8 without BOM:")
+            for filename in converted:
+                print("  " + filename)
+        else:
+            print("Checked " + str(len(filenames)) + " files. No file has a BOM.")
+    else:
+        for filename in converted:
+            print("\n" + filename + ": this file's encoding has been converted to UTF-8 without BOM to avoid broken metadata display.")
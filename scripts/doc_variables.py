@@ -0,0 +1,111 @@
+# This module resolves the `{{{ .path.to.key }}}` variables of the docs from variables.json.
+# The variables are flattened once into a table from each dotted path to its text, so a variable is replaced with one dict lookup.
+# A path that is not in variables.json, or whose value is empty, is not replaced. A path to an object is replaced by the text of the object.
+# As a script, it scans all Markdown files once and lists the variables that are not in variables.json and the variables that no file uses.
+# If files are given, only the variables that are not in variables.json are listed.
+# Usage: python3 scripts/doc_variables.py [--strict] [-j N] [--all | <file1.md> <file2.md> ...]
+# The script exits with 1 if a variable is not resolved, or with `--strict`, also if a variable is not used.
+
+import argparse
+import json
+import os
+import re
+import sys
+
+import file_runner
+
+VARIABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "variables.json")
+variable_pattern = re.compile(r"{{{\s*\.(.+?)\s*}}}")
+
+
+def load(path=VARIABLES_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    except Exception:
+        return {}
+
+
+# Return {dotted path: text} for every key of the variables, including the keys of objects. Keys that contain "." cannot be used in a path.
+def flatten(variables, prefix="", table=None):
+    table = {} if table is None else table
+    for key, value in variables.items():
+        if "." in key:
+            continue
+        path = prefix + key
+        text = str(value)
+        if text != "":
+            table[path] = text
+        if isinstance(value, dict):
+            flatten(value, path + ".", table)
+    return table
+
+
+# Replace the variables of `text` with their values in the flattened `table`. If `unresolved` is a list, append the paths of the
+# variables that are not replaced.
+def replace(text, table, unresolved=None):
+    def replacer(match):
+        path = match.group(1).strip()
+        value = table.get(path)
+        if value is None:
+            if unresolved is not None:
+                unresolved.append(path)
+            return match.group(0)
+        return value
+    return variable_pattern.sub(replacer, text)
+
+
+# Return the (line number, path) of every variable in a file.
+def scan_file(filename):
+    with open(filename, "r", encoding="utf-8", errors="replace") as fp:
+        text = fp.read()
+    found = []
+    line_num = 1
+    pos = 0
+    for match in variable_pattern.finditer(text):
+        line_num += text.count("\n", pos, match.start())
+        pos = match.start()
+        found.append((line_num, match.group(1).strip()))
+    return found
+
+
+# Return the paths of the table that no variable uses. A path is used if it, one of its objects or one of its keys is used.
+def unused_paths(table, used):
+    prefixes = set()
+    for path in used:
+        parts = path.split(".")
+        prefixes.update(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+    return sorted(path for path in table if path not in prefixes and not any(path.startswith(u + ".") for u in used))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the unresolved and unused variables of the docs.")
+    parser.add_argument("--variables", default=VARIABLES_PATH, help="the variables file. Default: variables.json")
+    parser.add_argument("--strict", action="store_true", help="also exit with 1 if a variable in the variables file is not used")
+    parser.add_argument("--all", action="store_true",
+                        help="check all Markdown files under the current directory, except .git, node_modules and media")
+    file_runner.add_jobs_argument(parser)
+    parser.add_argument("files", nargs="*", help="Markdown files to check")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    # Whether a variable is used is only known after all files are scanned.
+    whole_tree = args.all or not args.files
+    filenames = file_runner.find_markdown_files() if whole_tree else args.files
+
+    table = flatten(load(args.variables))
+    used = set()
+    unresolved = 0
+    for filename, found in zip(filenames, file_runner.imap_files(scan_file, filenames, args.jobs)):
+        for line_num, path in found:
+            used.add(path)
+            if path not in table:
+                unresolved += 1
+                print("%s:%d: unresolved variable {{{ .%s }}}" % (filename, line_num, path))
+    unused = unused_paths(table, used) if whole_tree else []
+    for path in unused:
+        print("%s: unused variable .%s" % (os.path.relpath(args.variables), path))
+    print("Checked %d files: %d unresolved variables, %d unused variables." % (len(filenames), unresolved, len(unused)), file=sys.stderr)
+    return 1 if unresolved or (args.strict and unused) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# This module runs a per-file check over a process pool for the scripts that take a list of files in `sys.argv`.
+# The results are returned in the original argument order, so the printed logs and exit codes are the same as a serial run.
+# The summary line, which compares the wall time with the serial time of all files, is printed to stderr to keep stdout unchanged.
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+EXCLUDE_DIRS = {".git", "node_modules", "media"}
+
+
+# Return all Markdown files under `root` in a stable order, for the modes that check the whole tree.
+def find_markdown_files(root="."):
+    filenames = []
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDE_DIRS)
+        for name in sorted(files):
+            if name.endswith(".md"):
+                filenames.append(os.path.normpath(os.path.join(dirpath, name)))
+    return filenames
+
+
+def add_jobs_argument(parser, default=1):
+    parser.add_argument("-j", "--jobs", type=int, default=default,
+                        help="number of worker processes. 0 means the number of CPUs. Default: %d%s" % (default, " (serial)" if default == 1 else ""))
+
+
+def resolve_jobs(jobs):
+    if jobs is None or jobs < 0:
+        return 1
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+# Call `func` for one file and return its result with the CPU time it used, which approximates its share of a serial run.
+# It is a class so that it can be pickled together with `func` and sent to the workers.
+class _Timed:
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, filename):
+        start = time.process_time()
+        result = self.func(filename)
+        return result, time.process_time() - start
+
+
+# Yield func(item) for each item in order, computed with `jobs` worker processes, as soon as the results are ready.
+# `initializer(*initargs)` sets up the state that `func` shares in each worker process, or in this process for a serial run.
+def imap_files(func, items, jobs=1, initializer=None, initargs=()):
+    jobs = resolve_jobs(jobs)
+    if jobs == 1 or len(items) < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield func(item)
+        return
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        yield from executor.map(func, items, chunksize=chunksize)
+
+
+# Return [func(filename) for filename in filenames], computed with `jobs` worker processes.
+# `func` must be a module-level function or another picklable callable.
+def map_files(func, filenames, jobs=1, report=True):
+    jobs = resolve_jobs(jobs)
+    start = time.perf_counter()
+    timed = _Timed(func)
+
+    if jobs == 1 or len(filenames) < 2:
+        results = [timed(filename) for filename in filenames]
+    else:
+        chunksize = max(1, len(filenames) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(timed, filenames, chunksize=chunksize))
+
+    wall = time.perf_counter() - start
+    serial = sum(elapsed for _, elapsed in results)
+    if report and jobs > 1:
+        speedup = serial / wall if wall else 0
+        print("Checked %d files in %.2fs with %d jobs (estimated serial time %.2fs, %.1fx)." % (len(filenames), wall, jobs, serial, speedup), file=sys.stderr)
+    return [result for result, _ in results]
@@ -12,6 +12,9 @@ MONOFONT="WenQuanYi Micro Hei Mono"
 #_version_tag="$(date '+%Y%m%d').$(git rev-parse --short HEAD)"
 _version_tag="$(date '+%Y%m%d')"
 
+# To render a large document faster, write shards with `python3 scripts/merge_by_toc.py ... --shards shards`
+# and render them in parallel with `python3 scripts/render_shards.py shards`, which uses the same options.
+
 # default version: `pandoc --latex-engine=xelatex doc.md -s -o output2.pdf`
 # used to debug template setting error
 
@@ -0,0 +1,53 @@
+# This module resolves the files and lines that changed since a git revision, for the incremental mode of the docs checkers.
+# It runs `git diff` once and returns the changed line numbers of each file in the working tree.
+
+import os
+import re
+import subprocess
+
+HUNK_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+def _git(args, cwd):
+    p = subprocess.run(["git", "-c", "core.quotepath=off"] + args, cwd=cwd, capture_output=True, encoding="utf-8")
+    if p.returncode != 0:
+        raise SystemExit("git " + " ".join(args) + " failed: " + p.stderr.strip())
+    return p.stdout
+
+
+# Return a dict that maps the real path of each changed file to the set of its changed line numbers.
+# The value is None if the whole file is new, such as an untracked file.
+def changed_lines(rev, cwd="."):
+    top = _git(["rev-parse", "--show-toplevel"], cwd).strip()
+    options = ["--no-color", "--no-ext-diff", "--diff-filter=d", rev, "--"]
+    # The names come from `-z` output, which is not quoted. The patch has one "diff --git" header per file, in the same order.
+    names = [name for name in _git(["diff", "--name-only", "-z"] + options, top).split("\0") if name]
+    diff = _git(["diff", "-U0"] + options, top)
+
+    changes = {}
+    lines = None
+    file_index = 0
+    for line in diff.split("\n"):
+        if line.startswith("diff --git "):
+            if file_index >= len(names):
+                raise SystemExit("git diff %s: the patch does not match the changed files" % rev)
+            lines = changes.setdefault(os.path.join(top, names[file_index]), set())
+            file_index += 1
+        elif line.startswith("@@") and lines is not None:
+            match = HUNK_PATTERN.match(line)
+            if match is None:
+                raise SystemExit("git diff %s: unexpected hunk header %r" % (rev, line))
+            start = int(match.group(1))
+            count = 1 if match.group(2) is None else int(match.group(2))
+            if count == 0:
+                # Lines were only deleted, which joins the lines around the deletion.
+                lines.update((start, start + 1))
+            else:
+                lines.update(range(start, start + count))
+    if file_index != len(names):
+        raise SystemExit("git diff %s: the patch does not match the changed files" % rev)
+
+    for path in _git(["ls-files", "--others", "--exclude-standard", "-z"], top).split("\0"):
+        if path:
+            changes[os.path.join(top, path)] = None
+    return changes
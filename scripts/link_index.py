@@ -0,0 +1,264 @@
+# This module keeps an on-disk index of the link graph of the docs: every Markdown file, its headings with their anchors on the docs site
+# (custom IDs `{#id}` or GitHub-style slugs, see link_table.py), its outbound links, and the backlinks to it from other files.
+# The index is built in one pass over the files and stored as JSON. The data of a file is keyed by the git blob hash of its content,
+# so an update only parses the files whose content is not in the index yet. For tracked and unmodified files, the blob hash comes from
+# the git index and the file is not opened at all. Links in code, comments and front matter are not links.
+#
+#     index = link_index.LinkIndex.load("link-index.json")
+#     index.update()  # all Markdown files, or index.update(filenames)
+#     index.save()
+#     index.anchors("overview.md")         # {"tidb-architecture", ...}
+#     index.links("overview.md")           # [Link(source, line, target, path, anchor), ...]
+#     index.backlinks("overview.md")       # the links from other files to overview.md
+#     index.broken_links()                 # links to missing files or anchors
+#
+# Usage: python3 scripts/link_index.py --index PATH [-j N] update
+#        python3 scripts/link_index.py --index PATH anchors|links|backlinks FILE
+#        python3 scripts/link_index.py --index PATH broken|unreferenced
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import tempfile
+from collections import namedtuple
+
+import file_runner
+import lint_cache
+import link_table
+import md_regions
+
+INDEX_FORMAT = 1
+# The modules whose source code defines the data of a file.
+INDEX_SOURCES = ["link_index.py", "link_table.py", "md_regions.py"]
+
+Heading = namedtuple("Heading", ["line", "level", "title", "anchor"])
+# `path` is the linked file relative to the docs root, `anchor` is the fragment without "#", or "" if there is none.
+Link = namedtuple("Link", ["source", "line", "target", "path", "anchor"])
+
+# Inline links and images, reference definitions, and HTML links.
+link_patterns = [
+    re.compile(r"\]\(\s*<?([^)\s>]+)>?(?:\s+[\"'][^\"']*[\"'])?\s*\)"),
+    re.compile(r"(?m)^[ \t]*\[[^\]]+\]:[ \t]*<?([^\s>]+)"),
+    re.compile(r"""<a\s[^>]*href=["']([^"']+)["']"""),
+]
+scheme_pattern = re.compile(r"^[A-Za-z][A-Za-z0-9+.\-]*:")
+
+
+# Return a hash of the parser. It changes whenever the parser sources change.
+def index_version():
+    digest = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for source in INDEX_SOURCES:
+        with open(os.path.join(here, source), "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+# Return the text with code, comments and front matter blanked, so that line numbers stay the same.
+def link_text(text):
+    try:
+        regions = md_regions.scan_regions(text)
+    except md_regions.UnclosedFenceError:
+        return text
+    return md_regions.mask_regions(text, regions, drop=(), blank=(md_regions.FRONTMATTER, md_regions.FENCE, md_regions.CODE,
+                                                                     md_regions.COMMENT))
+
+
+# Return the headings and the internal links of a file as stored in the index: {"headings": [[line, level, title, anchor]],
+# "links": [[line, target]]}. Links to URLs with a scheme, such as https: and mailto:, are not stored.
+def parse(text):
+    masked = link_text(text)
+    found = []
+    for pattern in link_patterns:
+        for match in pattern.finditer(masked):
+            target = match.group(1)
+            if not scheme_pattern.match(target):
+                found.append((match.start(), target))
+    found.sort()
+    links = []
+    line_num = 1
+    pos = 0
+    for start, target in found:
+        line_num += masked.count("\n", pos, start)
+        pos = start
+        links.append([line_num, target])
+    return {"headings": [list(heading) for heading in link_table.source_headings(text)], "links": links}
+
+
+# Return (blob hash, data) of a file.
+def parse_file(filename):
+    with open(filename, "rb") as fp:
+        data = fp.read()
+    text = data.decode("utf-8", "replace").replace("\r\n", "\n").replace("\r", "\n")
+    return lint_cache.blob_hash(data), parse(text)
+
+
+# Return (path, anchor) of a link target in `source`, relative to the docs root. Links to the docs root start with "/".
+def resolve_target(source, target):
+    path, _, anchor = target.partition("#")
+    if not path:
+        return source, anchor
+    if path.startswith("/"):
+        path = path[1:]
+    else:
+        path = posixpath.join(posixpath.dirname(source), path)
+    return posixpath.normpath(path), anchor
+
+
+class LinkIndex:
+
+    def __init__(self, path):
+        self.path = path
+        self.version = index_version()
+        self.file_blobs = {}  # file: blob hash
+        self.blobs = {}  # blob hash: data
+        self.parsed = 0
+        self._backlinks = None
+        self._dirty = False
+
+    # A missing, corrupted, or outdated index file gives an empty index.
+    @classmethod
+    def load(cls, path):
+        index = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+            if data.get("format") == INDEX_FORMAT and data.get("version") == index.version:
+                index.file_blobs = data["files"]
+                index.blobs = data["blobs"]
+        except (OSError, ValueError, AttributeError, KeyError):
+            pass
+        return index
+
+    # Index `filenames`, or all Markdown files under the current directory, and remove the other files from the index.
+    def update(self, filenames=None, jobs=1):
+        if filenames is None:
+            filenames = file_runner.find_markdown_files()
+        known = lint_cache.index_blob_hashes()
+        file_blobs = {}
+        todo = []
+        for filename in filenames:
+            name = os.path.relpath(filename).replace(os.sep, "/")
+            blob = known.get(os.path.realpath(filename))
+            if blob is not None and blob in self.blobs:
+                file_blobs[name] = blob
+            else:
+                todo.append(name)
+        for name, (blob, data) in zip(todo, file_runner.imap_files(parse_file, todo, jobs)):
+            file_blobs[name] = blob
+            if blob not in self.blobs:
+                self.blobs[blob] = data
+                self.parsed += 1
+        used = set(file_blobs.values())
+        self.blobs = {blob: data for blob, data in self.blobs.items() if blob in used}
+        if file_blobs != self.file_blobs or self.parsed:
+            self._dirty = True
+        self.file_blobs = file_blobs
+        self._backlinks = None
+
+    # Write the index file atomically.
+    def save(self):
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".link-index-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump({"format": INDEX_FORMAT, "version": self.version, "files": self.file_blobs, "blobs": self.blobs}, fp,
+                          separators=(",", ":"))
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
+
+    def files(self):
+        return sorted(self.file_blobs)
+
+    def __contains__(self, name):
+        return name in self.file_blobs
+
+    def _data(self, name):
+        blob = self.file_blobs.get(name)
+        return self.blobs[blob] if blob is not None else {"headings": [], "links": []}
+
+    def headings(self, name):
+        return [Heading(*heading) for heading in self._data(name)["headings"]]
+
+    def anchors(self, name):
+        return {heading[3] for heading in self._data(name)["headings"]}
+
+    def links(self, name):
+        return [Link(name, line, target, *resolve_target(name, target)) for line, target in self._data(name)["links"]]
+
+    # Return the links from all files to `name`, including links within the file.
+    def backlinks(self, name):
+        if self._backlinks is None:
+            self._backlinks = {}
+            for source in self.file_blobs:
+                for link in self.links(source):
+                    self._backlinks.setdefault(link.path, []).append(link)
+        return self._backlinks.get(name, [])
+
+    # Return the links to Markdown files that are not in the index, or to anchors that the linked file does not have.
+    def broken_links(self):
+        broken = []
+        for source in self.files():
+            for link in self.links(source):
+                if not link.path.endswith(".md"):
+                    continue
+                if link.path not in self.file_blobs or (link.anchor and link.anchor not in self.anchors(link.path)):
+                    broken.append(link)
+        return broken
+
+    # Return the files that no other file links to.
+    def unreferenced(self):
+        return [name for name in self.files() if not any(link.source != name for link in self.backlinks(name))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the link graph index of the docs.")
+    parser.add_argument("--index", metavar="PATH", default=os.environ.get("DOCS_LINK_INDEX"),
+                        help="the index file. Default: $DOCS_LINK_INDEX")
+    parser.add_argument("--no-update", action="store_true", help="query the index as it is, without updating the changed files first")
+    file_runner.add_jobs_argument(parser)
+    parser.add_argument("command", choices=["update", "anchors", "links", "backlinks", "broken", "unreferenced"])
+    parser.add_argument("file", nargs="?", help="the file to query, relative to the docs root")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if not args.index:
+        parser.error("--index or $DOCS_LINK_INDEX is required")
+    if args.command in ("anchors", "links", "backlinks") and not args.file:
+        parser.error("the %s command needs a file" % args.command)
+
+    index = LinkIndex.load(args.index)
+    if args.command == "update" or not args.no_update:
+        index.update(jobs=args.jobs)
+        index.save()
+        print("Link index: %d files, %d parsed." % (len(index.file_blobs), index.parsed), file=sys.stderr)
+
+    if args.command == "anchors":
+        for heading in index.headings(args.file):
+            print("%s:%d: #%s %s" % (args.file, heading.line, heading.anchor, heading.title))
+    elif args.command in ("links", "backlinks", "broken"):
+        if args.command == "links":
+            links = index.links(args.file)
+        elif args.command == "backlinks":
+            links = index.backlinks(args.file)
+        else:
+            links = index.broken_links()
+        for link in links:
+            print("%s:%d: %s" % (link.source, link.line, link.target))
+    elif args.command == "unreferenced":
+        for name in index.unreferenced():
+            print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# This module builds the link table of a merged document such as the `doc.md` of `merge_by_toc.py`.
+# On the docs site, a heading has the anchor of its custom ID `{#id}`, or the GitHub-style slug of its text, numbered if the slug repeats
+# in the file, and links are written as `/path.md#anchor`. In the merged document, the same heading text can be in many chapters,
+# so the table maps each (file, anchor) to an anchor that is unique in the merged document, numbered in TOC order if it repeats.
+# The merged headings get their anchors as explicit `{#anchor}` attributes, and each link is resolved with one dict lookup.
+#
+#     table = LinkTable()
+#     anchors = table.add_file("overview.md", source_anchors(text))  # to write to the headings as {#anchor}
+#     table.resolve("overview.md", "architecture")  # "architecture-1" if an earlier chapter has the same anchor
+#     table.resolve("overview.md")                  # the anchor of the chapter title
+
+import re
+
+import md_regions
+
+# A heading line with an optional custom ID.
+heading_pattern = re.compile(r"^(#+)\s+(.*?)(?:\s+\{#([^\}]+)\})?\s*$")
+# Markup that is not part of the heading text outside code spans: HTML tags, and links and images, of which only the text is kept.
+code_span_pattern = re.compile(r"(`[^`]*`)")
+tag_pattern = re.compile(r"<[^>]*>")
+link_pattern = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+slug_removed_pattern = re.compile(r"[^\w\- ]")
+# The lines that can be headings or code fences. The other lines do not change the state of HeadingScanner.
+candidate_line_pattern = re.compile(r"^(?:#|[ \t]*(?:``|~~)).*$", re.MULTILINE)
+
+
+# Return the GitHub-style slug of a heading text: lowercase, without punctuation, and with a hyphen for each space.
+def heading_slug(title):
+    parts = code_span_pattern.split(link_pattern.sub(r"\1", title))
+    text = "".join(part if i % 2 else tag_pattern.sub("", part) for i, part in enumerate(parts))
+    text = text.replace("`", "").replace("*", "")
+    return slug_removed_pattern.sub("", text.strip().lower()).replace(" ", "-")
+
+
+# Return `anchor`, or `anchor-1`, `anchor-2` and so on if it is already used, and record it as used.
+def number_anchor(anchor, counts):
+    result = anchor
+    while result in counts:
+        counts[anchor] += 1
+        result = "%s-%d" % (anchor, counts[anchor])
+    counts[result] = 0
+    return result
+
+
+# Find the headings in the lines of a file. Lines in code blocks are not headings.
+class HeadingScanner:
+
+    def __init__(self):
+        self.fence_char = None
+
+    # Return (hashes, title, custom ID or None) if the line is a heading, otherwise None.
+    # Call it in order for every line that starts with "#" or contains "``" or "~~"; the other lines are never headings or fences.
+    def heading(self, line):
+        if self.fence_char is not None:
+            if md_regions.FENCE_CLOSER_PATTERNS[self.fence_char].match(line):
+                self.fence_char = None
+            return None
+        if line.startswith("#"):
+            match = heading_pattern.match(line)
+            if match and match.group(2).strip():
+                return match.group(1), match.group(2).strip(), match.group(3)
+        elif "``" in line or "~~" in line:
+            opener = md_regions.FENCE_OPENER_PATTERN.match(line)
+            if opener:
+                self.fence_char = opener.group(1)[0]
+        return None
+
+
+# Return (line number, level, title, anchor) of the headings of a file, with the anchors that they have on the docs site, in order.
+def source_headings(text):
+    scanner = HeadingScanner()
+    counts = {}
+    headings = []
+    line_num = 1
+    pos = 0
+    for match in candidate_line_pattern.finditer(text):
+        heading = scanner.heading(match.group(0))
+        if heading is not None:
+            hashes, title, custom_id = heading
+            line_num += text.count("\n", pos, match.start())
+            pos = match.start()
+            headings.append((line_num, len(hashes), title, number_anchor(custom_id or heading_slug(title) or "section", counts)))
+    return headings
+
+
+# Return the anchors that the headings of a file have on the docs site, in order.
+def source_anchors(text):
+    return [heading[3] for heading in source_headings(text)]
+
+
+class LinkTable:
+
+    def __init__(self):
+        # (file, anchor on the docs site): anchor in the merged document. (file, ""): the anchor of the first heading.
+        self.anchors = {}
+        self.counts = {}
+
+    # Add the headings of the next chapter in TOC order, as returned by source_anchors(), and return their anchors in the merged document.
+    # If a file is in the TOC more than once, links go to its first chapter.
+    def add_file(self, name, anchors):
+        merged = [number_anchor(anchor, self.counts) for anchor in anchors]
+        if merged:
+            self.anchors.setdefault((name, ""), merged[0])
+        for anchor, unique in zip(anchors, merged):
+            self.anchors.setdefault((name, anchor), unique)
+        return merged
+
+    # Return the anchor in the merged document of a heading of a file, or of the file itself, or None if there is no such heading.
+    def resolve(self, name, anchor=""):
+        return self.anchors.get((name, anchor))
@@ -0,0 +1,239 @@
+# This script benchmarks the docs lint scripts on the real docs tree and on generated synthetic corpora.
+# Each checker runs as a subprocess, the same as in CI, and the fastest of `--repeat` runs is recorded.
+# The synthetic corpora stress the parts that the regex-heavy checkers are sensitive to: deep and nested code fences, long tables,
+# nested CustomContent blocks, inline code, comments and CJK text. A corpus of scale N has N times the files of the 1x corpus.
+# Usage: python3 scripts/lint_benchmark.py [--scales 10,100] [--repeat 3] [--output result.json] [--baseline baseline.json] [--threshold 0.2]
+# With `--baseline`, the script exits with 1 if any checker is slower than the baseline by more than the threshold.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import file_runner
+
+RESULT_FORMAT = 1
+BASE_FILES = 20
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name: (script, extra arguments, whether the script modifies the checked files)
+CHECKERS = {
+    "check-tags": ("check-tags.py", [], False),
+    "check-tags-stream": ("check-tags.py", ["--stream"], False),
+    "check-conflicts": ("check-conflicts.py", [], False),
+    "check-manual-line-breaks": ("check-manual-line-breaks.py", [], False),
+    "check-control-char": ("check-control-char.py", [], False),
+    "check-zh-punctuation": ("check-zh-punctuation.py", [], False),
+    "lint-engine": ("lint_engine.py", [], False),
+    "file-format-lint": ("file-format-lint.py", [], True),
+}
+
+WORDS = ("TiDB", "cluster", "the", "table", "index", "replica", "region", "leader", "query", "transaction", "statement", "PD", "TiKV",
+         "configure", "parameter", "value", "default", "performance", "storage", "node", "schema", "partition", "backup", "restore")
+CJK_TEXT = ("分布式数据库", "事务", "集群", "存储引擎", "副本", "调度", "查询优化", "索引", "分区表", "备份与恢复")
+CJK_PUNCTUATION = "，。：；！？（）“”"
+PLATFORMS = ("tidb", "tidb-cloud")
+PLANS = ("starter", "essential", "dedicated", "premium")
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng):
+    parts = [_sentence(rng, rng.randint(6, 20)) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.4:
+        parts.insert(1, "Use `" + rng.choice(WORDS).lower() + "` or ``" + rng.choice(WORDS) + " `x` y`` for details.")
+    if rng.random() < 0.2:
+        parts.append("See [" + rng.choice(WORDS) + "](/" + rng.choice(WORDS).lower() + ".md#" + rng.choice(WORDS).lower() + ").")
+    return " ".join(parts) + "\n"
+
+
+def _cjk_paragraph(rng):
+    return "".join(rng.choice(CJK_TEXT) + rng.choice(CJK_PUNCTUATION) for _ in range(rng.randint(5, 30))) + "\n"
+
+
+def _table(rng, rows):
+    lines = ["| Name | Type | Default | Description |\n", "| --- | --- | --- | --- |\n"]
+    for _ in range(rows):
+        lines.append("| `" + rng.choice(WORDS).lower() + "_" + str(rng.randint(0, 999)) + "` | " + rng.choice(("String", "Integer", "Boolean")) +
+                     " | `" + str(rng.randint(0, 100)) + "` | " + _sentence(rng, rng.randint(5, 25)) + " |\n")
+    return "".join(lines)
+
+
+# A long code block whose content looks like Markdown: fences of the other character, backtick runs, tags and comments.
+# The checkers close a code block at any fence of the same character, so these must not close it.
+def _fence(rng, depth):
+    char, other = rng.choice((("`", "~"), ("~", "`")))
+    lines = [char * rng.randint(3, 6) + rng.choice(("sql", "shell", "yaml", "markdown")) + "\n"]
+    for _ in range(depth):
+        lines.append(other * 3 + "\n")
+        lines.append("SELECT * FROM t WHERE a < 1 AND b > 2; -- <not-a-tag>\n" * rng.randint(1, 20))
+        lines.append("``" + rng.choice(WORDS) + "`` <!-- not a comment -->\n" + "  " * depth + "- item <br/>\n")
+        lines.append(other * 3 + "\n")
+    lines.append(char * 3 + "\n")
+    return "".join(lines)
+
+
+def _custom_content(rng, depth):
+    attributes = 'platform="' + rng.choice(PLATFORMS) + '"'
+    if rng.random() < 0.5:
+        attributes += ' plan="' + ",".join(rng.sample(PLANS, rng.randint(1, 3))) + '"'
+    body = _paragraph(rng)
+    if depth > 0:
+        body += "\n" + _custom_content(rng, depth - 1)
+    return "<CustomContent " + attributes + ">\n\n" + body + "\n</CustomContent>\n"
+
+
+# Return the content of one synthetic document.
+def synthetic_document(rng, index):
+    parts = ["---\ntitle: Synthetic document " + str(index) + "\nsummary: " + _sentence(rng) + "\n---\n\n",
+             "# Synthetic document " + str(index) + "\n\n"]
+    for section in range(rng.randint(4, 12)):
+        parts.append("## Section " + str(section) + "\n\n")
+        for _ in range(rng.randint(2, 6)):
+            kind = rng.random()
+            if kind < 0.45:
+                parts.append(_paragraph(rng))
+            elif kind < 0.55:
+                parts.append(_cjk_paragraph(rng))
+            elif kind < 0.7:
+                parts.append(_fence(rng, rng.randint(0, 8)))
+            elif kind < 0.8:
+                parts.append(_table(rng, rng.randint(5, 80)))
+            elif kind < 0.9:
+                parts.append(_custom_content(rng, rng.randint(0, 3)))
+            else:
+                parts.append("> **Note:**\n>\n> " + _sentence(rng) + "\n\n<!-- " + _sentence(rng) + "\n" + _sentence(rng) + " -->\n\n"
+                             '{{< copyable "sql" >}}\n')
+            parts.append("\n")
+    return "".join(parts)
+
+
+# Write a synthetic corpus of `scale` times BASE_FILES files to `directory` and return the file names.
+def generate_corpus(directory, scale, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for index in range(BASE_FILES * scale):
+        filename = os.path.join(directory, "synthetic-%05d.md" % index)
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(synthetic_document(rng, index))
+        filenames.append(filename)
+    return filenames
+
+
+def corpus_info(filenames):
+    return {"files": len(filenames), "bytes": sum(os.path.getsize(filename) for filename in filenames)}
+
+
+# Run a checker `repeat` times and return its timings, or an error if the checker cannot run, for example, without `zhon`.
+def time_checker(name, filenames, repeat):
+    script, arguments, _ = CHECKERS[name]
+    command = [sys.executable, os.path.join(HERE, script)] + arguments + filenames
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        p = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf-8")
+        runs.append(time.perf_counter() - start)
+        # The checkers exit with 1 when they find issues. A traceback or another exit code means that the checker failed.
+        if p.returncode not in (0, 1) or "Traceback (most recent call last)" in p.stderr:
+            error = p.stderr.strip().splitlines()
+            return {"error": error[-1] if error else "exit code " + str(p.returncode)}
+    return {"seconds": min(runs), "runs": runs}
+
+
+# Return the results that are slower than the baseline by more than `threshold`, as (key, baseline seconds, seconds).
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if "seconds" not in result or base is None or "seconds" not in base:
+            continue
+        if result["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append((key, base["seconds"], result["seconds"]))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the docs lint scripts on the docs tree and on synthetic corpora.")
+    parser.add_argument("--scales", default="10,100",
+                        help="comma-separated sizes of the synthetic corpora, in multiples of %d files. Default: %%(default)s" % BASE_FILES)
+    parser.add_argument("--checkers", default=",".join(CHECKERS),
+                        help="comma-separated checkers to run. Default: all of " + ", ".join(CHECKERS))
+    parser.add_argument("--no-real", action="store_true", help="do not benchmark on the Markdown files under the current directory")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each checker, of which the fastest is recorded. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpora. Default: %(default)s")
+    parser.add_argument("--workdir", help="directory for the synthetic corpora, which is kept. Default: a temporary directory that is removed")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the results with this JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction by which a checker may be slower than the baseline before it counts as a regression. Default: %(default)s")
+    args = parser.parse_args(argv)
+    args.scales = [int(scale) for scale in args.scales.split(",") if scale.strip()]
+    args.checkers = [name.strip() for name in args.checkers.split(",") if name.strip()]
+    for name in args.checkers:
+        if name not in CHECKERS:
+            parser.error("unknown checker: " + name)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lint-benchmark-")
+
+    corpora = {}
+    if not args.no_real:
+        corpora["real"] = file_runner.find_markdown_files()
+    for scale in args.scales:
+        corpora["synthetic-%dx" % scale] = generate_corpus(os.path.join(workdir, "%dx" % scale), scale, args.seed)
+
+    report = {
+        "format": RESULT_FORMAT,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpora": {name: corpus_info(filenames) for name, filenames in corpora.items()},
+        "results": {},
+    }
+    try:
+        for corpus, filenames in corpora.items():
+            for name in args.checkers:
+                # Do not let the benchmark rewrite the files of the docs tree.
+                if CHECKERS[name][2] and corpus == "real":
+                    continue
+                key = corpus + "/" + name
+                result = time_checker(name, filenames, args.repeat)
+                report["results"][key] = result
+                if "error" in result:
+                    print("%-45s skipped: %s" % (key, result["error"]))
+                else:
+                    print("%-45s %8.3fs" % (key, result["seconds"]))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+            fp.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        regressions = compare(report["results"], baseline, args.threshold)
+        for key, base, seconds in regressions:
+            print("REGRESSION: %s took %.3fs, %.0f%% slower than the baseline %.3fs." % (key, seconds, (seconds / base - 1) * 100, base))
+        if regressions:
+            return 1
+        print("No checker is more than %.0f%% slower than the baseline." % (args.threshold * 100))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
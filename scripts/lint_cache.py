@@ -0,0 +1,150 @@
+# This module stores the findings of the lint rules in an on-disk cache, so unchanged files are not checked again.
+# A cache key is the git blob hash of the file content plus a hash of the rule implementation, so the cache does not depend on file paths.
+# For files that are tracked by git and unmodified, the blob hash comes from the git index and the file is not opened at all.
+# The cache is one JSON file that is written atomically. A missing, corrupted, or outdated cache file is ignored, so it is safe to restore and save it as a CI artifact.
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+CACHE_FORMAT = 1
+DEFAULT_MAX_ENTRIES = 100000
+# The modules whose source code defines the behavior of the rules: the rules, the regions they use, and the document that
+# lint_engine.py decodes, splits into lines and passes to them.
+RULE_SOURCES = ["lint_engine.py", "lint_rules.py", "md_regions.py"]
+
+
+# Return the git blob hash of the given content, the same as `git hash-object`.
+def blob_hash(data):
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _git(args, cwd):
+    try:
+        p = subprocess.run(["git"] + args, cwd=cwd, capture_output=True)
+    except OSError:
+        return None
+    if p.returncode != 0:
+        return None
+    return p.stdout
+
+
+# Return a dict that maps the real paths of tracked and unmodified files to their blob hashes in the git index.
+def index_blob_hashes(cwd="."):
+    top = _git(["rev-parse", "--show-toplevel"], cwd)
+    if top is None:
+        return {}
+    top = top.decode("utf-8").strip()
+    staged = _git(["ls-files", "-s", "-z"], top)
+    modified = _git(["ls-files", "-m", "-z"], top)
+    if staged is None or modified is None:
+        return {}
+
+    modified = set(modified.decode("utf-8").split("\0"))
+    hashes = {}
+    for entry in staged.decode("utf-8").split("\0"):
+        if not entry:
+            continue
+        # <mode> <object> <stage>\t<path>
+        info, path = entry.split("\t", 1)
+        if path in modified:
+            continue
+        hashes[os.path.join(top, path)] = info.split()[1]
+    return hashes
+
+
+# Return a hash of the rule implementation. It changes whenever the rule sources change.
+def rule_version(rule_name):
+    digest = hashlib.sha1(rule_name.encode("utf-8"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    for source in RULE_SOURCES:
+        with open(os.path.join(here, source), "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+class LintCache:
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._versions = {}
+        self._index = None
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path, max_entries=DEFAULT_MAX_ENTRIES):
+        cache = cls(path, max_entries)
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+            if data.get("format") == CACHE_FORMAT and isinstance(data.get("entries"), dict):
+                # Entries that are not [access time, value], such as those of a truncated or edited file, are dropped.
+                cache.entries = {key: entry for key, entry in data["entries"].items() if cache._valid_entry(entry)}
+        except (OSError, ValueError, AttributeError):
+            pass
+        return cache
+
+    def _valid_entry(self, entry):
+        return (isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], (int, float)) and not isinstance(entry[0], bool)
+                and self._valid_value(entry[1]))
+
+    # Whether a loaded value has the type that `put` stores. None is never stored, because `get` returns None for a miss.
+    def _valid_value(self, value):
+        return isinstance(value, (dict, list))
+
+    def _key(self, blob, rule_name):
+        if rule_name not in self._versions:
+            self._versions[rule_name] = rule_version(rule_name)
+        return blob + ":" + self._versions[rule_name]
+
+    # Return the blob hash of a file, from the git index if possible.
+    def file_blob(self, filename):
+        if self._index is None:
+            self._index = index_blob_hashes()
+        blob = self._index.get(os.path.realpath(filename))
+        if blob is None:
+            with open(filename, "rb") as fp:
+                blob = blob_hash(fp.read())
+        return blob
+
+    def get(self, blob, rule_name):
+        entry = self.entries.get(self._key(blob, rule_name))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[0] = time.time()
+        self._dirty = True
+        return entry[1]
+
+    def put(self, blob, rule_name, result):
+        self.entries[self._key(blob, rule_name)] = [time.time(), result]
+        self._dirty = True
+
+    # Keep the most recently used entries and write the cache file atomically.
+    def save(self):
+        if not self._dirty:
+            return
+        if len(self.entries) > self.max_entries:
+            recent = sorted(self.entries.items(), key=lambda item: item[1][0], reverse=True)
+            self.entries = dict(recent[:self.max_entries])
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".lint-cache-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump({"format": CACHE_FORMAT, "entries": self.entries}, fp, separators=(",", ":"))
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
@@ -0,0 +1,303 @@
+# This script runs the docs lint rules defined in `lint_rules.py` in a single pass.
+# Each file is read and decoded only once, and every selected rule checks the same `Document`.
+# Usage: python3 scripts/lint_engine.py [--rules tags,conflicts,...] [--jobs N] [--cache PATH] [--since REV] [--stream] [--profile PATH]
+#                                      [--tag-index PATH] [--watch] [--all | <file1.md> <file2.md> ...]
+# The `check-*.py` scripts are thin wrappers around this engine that select one rule each.
+
+import argparse
+import os
+import sys
+import time
+
+import file_runner
+import git_changes
+import lint_cache
+import lint_profile
+import lint_rules
+import lint_watch
+import md_regions
+import tag_index
+
+DEFAULT_RULES = ["tags", "conflicts", "manual-line-breaks", "control-char", "zh-punctuation"]
+
+
+# Split text into lines the same way as iterating over a text-mode file object.
+def split_lines(text):
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+# The decoded view of a file that is shared by all rules.
+class Document:
+
+    # `touched` is the set of changed line numbers in the `--since` mode, or None to check all lines.
+    # If `data` is None, the file is read when a rule needs its content.
+    def __init__(self, filename, data, touched=None):
+        self.filename = filename
+        self._data = data
+        self.touched = touched
+        self._text = None
+        self._lines = None
+        self._regions = None
+        self._shared = {}
+
+    # With `stream`, the file is not read in advance, so rules that support it can read the file line by line.
+    @classmethod
+    def from_file(cls, filename, touched=None, stream=False):
+        if stream:
+            return cls(filename, None, touched)
+        with open(filename, "rb") as fp:
+            return cls(filename, fp.read(), touched)
+
+    @property
+    def data(self):
+        if self._data is None:
+            with open(self.filename, "rb") as fp:
+                self._data = fp.read()
+        return self._data
+
+    # Whether the content is not in memory yet, so a rule that can check the file line by line should do so.
+    @property
+    def streaming(self):
+        return self._data is None
+
+    @property
+    def text(self):
+        if self._text is None:
+            # Universal newlines, as with open(filename, "r").
+            self._text = self.data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        return self._text
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = split_lines(self.text)
+        return self._lines
+
+    # Return (line number, line) for the lines that line-local rules need to check.
+    def numbered_lines(self):
+        if self.touched is None:
+            return enumerate(self.lines, 1)
+        return ((lineNum, self.lines[lineNum - 1]) for lineNum in sorted(self.touched) if lineNum <= len(self.lines))
+
+    # Front matter, code, comment and shortcode regions. Raise md_regions.UnclosedFenceError if a code block is not closed.
+    @property
+    def regions(self):
+        if self._regions is None:
+            self._regions = md_regions.scan_regions(self.text)
+        return self._regions
+
+    # Return `func(self)`, computed once for the document, for intermediate results that several rules use.
+    def shared(self, key, func):
+        if key not in self._shared:
+            self._shared[key] = func(self)
+        return self._shared[key]
+
+
+def get_rules(names):
+    rules = []
+    for name in names:
+        if name not in lint_rules.RULES:
+            raise SystemExit("Unknown rule: " + name + ". Available rules: " + ", ".join(sorted(lint_rules.RULES)))
+        rules.append(lint_rules.RULES[name])
+    return rules
+
+
+# Run the rules on one file. Return a list of (rule name, result), where a result is {"findings": [...]} or {"fatal": message}.
+# The rules after a fatal error are not run. If `timings` is a list, append (rule name, seconds) for reading the file and for each rule.
+def check_file(filename, rule_names, touched=None, stream=False, timings=None):
+    results = []
+    start = time.perf_counter()
+    doc = Document.from_file(filename, touched, stream)
+    if timings is not None:
+        timings.append((lint_profile.READ, time.perf_counter() - start))
+    for name in rule_names:
+        start = time.perf_counter()
+        try:
+            results.append((name, {"findings": lint_rules.RULES[name].check(doc)}))
+        except lint_rules.FatalLintError as e:
+            results.append((name, {"fatal": str(e)}))
+            break
+        finally:
+            if timings is not None:
+                timings.append((name, time.perf_counter() - start))
+    return results
+
+
+def _check_task(task):
+    timings = []
+    return check_file(*task, timings=timings), timings
+
+
+# Return the results of all files in order. Cached results are reused, and only the missing rules are run.
+# `changes` maps real paths to changed line numbers in the `--since` mode. The timings of the rules that run are added to `profile`.
+def check_files(filenames, rule_names, jobs=1, cache=None, changes=None, stream=False, profile=None):
+    cached = []
+    tasks = []
+    for filename in filenames:
+        touched = None if changes is None else changes[os.path.realpath(filename)]
+        file_cached = {}
+        if cache is not None:
+            blob = cache.file_blob(filename)
+            for name in rule_names:
+                if lint_rules.RULES[name].cacheable:
+                    result = cache.get(blob, name)
+                    if result is not None:
+                        file_cached[name] = result
+        cached.append(file_cached)
+        missing = [name for name in rule_names if name not in file_cached]
+        # A cached fatal error stops the file, so the following rules need not run.
+        for name in rule_names:
+            if "fatal" in file_cached.get(name, {}):
+                missing = [m for m in missing if rule_names.index(m) < rule_names.index(name)]
+                break
+        tasks.append((filename, missing, touched, stream))
+
+    todo = [task for task in tasks if task[1]]
+    computed = iter(file_runner.map_files(_check_task, todo, jobs))
+
+    checked = []
+    for (filename, missing, touched, _), file_cached in zip(tasks, cached):
+        results = {}
+        if missing:
+            file_results, timings = next(computed)
+            results = dict(file_results)
+            if profile is not None:
+                profile.add(filename, timings)
+        if cache is not None and results:
+            blob = cache.file_blob(filename)
+            for name, result in results.items():
+                rule = lint_rules.RULES[name]
+                # Findings of line-local rules that only checked the changed lines are incomplete.
+                if rule.cacheable and not (touched is not None and rule.line_local):
+                    cache.put(blob, name, result)
+        results.update(file_cached)
+        ordered = []
+        for name in rule_names:
+            if name not in results:
+                break
+            ordered.append((name, results[name]))
+            if "fatal" in results[name]:
+                break
+        checked.append(ordered)
+    return checked
+
+
+# Return the files to check in the `--since` mode: the changed files among `filenames`, or all changed Markdown files.
+def select_changed(filenames, changes):
+    if not filenames:
+        return sorted(os.path.relpath(path) for path in changes if path.endswith(".md"))
+    return [filename for filename in filenames if os.path.realpath(filename) in changes]
+
+
+# With `index`, the tag trees from the "tag-tree" rule are stored in that tag index.
+def run(filenames, rules, out=sys.stdout, jobs=1, cache=None, changes=None, stream=False, profile=None, index=None):
+    failed_rules = set()
+    if changes is not None:
+        filenames = select_changed(filenames, changes)
+    filenames = [filename for filename in filenames if os.path.isfile(filename)]
+    rule_names = [rule.name for rule in rules]
+    checked = check_files(filenames, rule_names, jobs, cache, changes, stream, profile)
+    if cache is not None:
+        cache.save()
+        print("Lint cache: %d hits, %d misses." % (cache.hits, cache.misses), file=sys.stderr)
+    if index is not None:
+        for results in checked:
+            for name, result in results:
+                if name == tag_index.TAG_TREE and "findings" in result:
+                    tag_index.add(index, result["findings"])
+        index.save()
+
+    for filename, results in zip(filenames, checked):
+        for name, result in results:
+            if "fatal" in result:
+                out.write(filename + result["fatal"] + "\n")
+                return 1
+            rule = lint_rules.RULES[name]
+            findings = result["findings"]
+            touched = None if changes is None else changes[os.path.realpath(filename)]
+            if touched is not None and rule.line_local:
+                findings = [finding for finding in findings if rule.finding_line(finding) in touched]
+            if findings:
+                out.write(rule.report(filename, findings))
+            if rule.failed(findings):
+                failed_rules.add(name)
+
+    footers = []
+    for rule in rules:
+        if rule.name in failed_rules and rule.footer is not None and rule.footer not in footers:
+            footers.append(rule.footer)
+    for footer in footers:
+        out.write(footer + "\n")
+
+    return 1 if failed_rules else 0
+
+
+def parse_args(argv, rules):
+    parser = argparse.ArgumentParser(description="Check Markdown files with the docs lint rules.")
+    if rules is None:
+        parser.add_argument("--rules", default=",".join(DEFAULT_RULES),
+                            help="comma-separated rules to run. Available rules: " + ", ".join(sorted(lint_rules.RULES)))
+    file_runner.add_jobs_argument(parser)
+    parser.add_argument("--cache", metavar="PATH", default=os.environ.get("DOCS_LINT_CACHE"),
+                        help="reuse findings stored in this cache file for unchanged files. Default: $DOCS_LINT_CACHE")
+    parser.add_argument("--cache-size", type=int, default=lint_cache.DEFAULT_MAX_ENTRIES,
+                        help="maximum number of cache entries to keep. Default: %(default)s")
+    parser.add_argument("--since", metavar="REV",
+                        help="only check the files changed since REV, and report line-local findings only on changed lines. "
+                             "If no files are given, check all changed Markdown files")
+    parser.add_argument("--stream", action="store_true",
+                        help="read files line by line in the rules that support it (tags), so that very large files such as "
+                             "the merged doc.md are checked with bounded memory")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write the time and bytes of each rule on each file as JSON to this file, and print the slowest ones to stderr")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N", help="number of the slowest rule runs to print. Default: %(default)s")
+    parser.add_argument("--profile-collapsed", metavar="PATH",
+                        help="also write the profile in the collapsed stack format for flame graphs to this file")
+    parser.add_argument("--tag-index", metavar="PATH",
+                        help="also store the tag tree of each file, with tag attributes, byte offsets and nesting, in this tag index file "
+                             "for other scripts. See tag_index.py")
+    parser.add_argument("--all", action="store_true",
+                        help="check all Markdown files under the current directory, except .git, node_modules and media")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and check each file again when it is saved. If no files are given, watch all Markdown files")
+    parser.add_argument("--interval", type=float, default=0.2, help="polling interval of --watch in seconds. Default: %(default)s")
+    parser.add_argument("files", nargs="*", help="Markdown files to check")
+    args = parser.parse_args(argv)
+    if rules is None:
+        rules = [name.strip() for name in args.rules.split(",") if name.strip()]
+    args.rules = rules
+    return args
+
+
+# `rules` is set by the thin `check-*.py` wrappers. Otherwise, the rules come from `--rules`.
+def main(argv=None, rules=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv, rules)
+    if args.all:
+        args.files = file_runner.find_markdown_files()
+    if args.watch:
+        filenames = args.files or file_runner.find_markdown_files()
+        return lint_watch.Watcher(filenames, get_rules(args.rules), Document).run(args.interval)
+    cache = lint_cache.LintCache.load(args.cache, args.cache_size) if args.cache else None
+    changes = git_changes.changed_lines(args.since) if args.since else None
+    profile = lint_profile.Profile() if args.profile else None
+    index = None
+    if args.tag_index:
+        index = tag_index.load(args.tag_index)
+        if tag_index.TAG_TREE not in args.rules:
+            args.rules.append(tag_index.TAG_TREE)
+    start = time.perf_counter()
+    status = run(args.files, get_rules(args.rules), jobs=args.jobs, cache=cache, changes=changes, stream=args.stream, profile=profile,
+                 index=index)
+    if profile is not None:
+        report = profile.report(time.perf_counter() - start, file_runner.resolve_jobs(args.jobs))
+        lint_profile.write(report, args.profile, args.profile_top, args.profile_collapsed)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# This module records how long each lint rule takes on each file, for the `--profile` option of `lint_engine.py` and the `check-*.py` scripts.
+# The report is a JSON file with the wall time and bytes of every (rule, file) pair, and a summary of the slowest pairs is printed to stderr.
+# Reading a file is recorded as the "(read)" rule. Decoding happens lazily, so it is counted in the first rule that needs the text.
+# Rules answered from the lint cache are not run and not recorded.
+# The report can be converted to the collapsed stack format of flamegraph.pl and speedscope:
+#     python3 scripts/lint_profile.py profile.json > profile.folded
+
+import json
+import os
+import sys
+
+PROFILE_FORMAT = 1
+READ = "(read)"
+
+
+class Profile:
+
+    def __init__(self):
+        # filename: (bytes, [(rule name, seconds)])
+        self.files = {}
+
+    def add(self, filename, timings):
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            size = 0
+        self.files[filename] = (size, timings)
+
+    def report(self, wall, jobs=1):
+        rules = {}
+        files = []
+        for filename, (size, timings) in self.files.items():
+            for name, seconds in timings:
+                total = rules.setdefault(name, {"seconds": 0.0, "bytes": 0, "files": 0})
+                total["seconds"] += seconds
+                total["bytes"] += size
+                total["files"] += 1
+            files.append({"file": filename, "bytes": size, "rules": dict(timings)})
+        return {"format": PROFILE_FORMAT, "wall": wall, "jobs": jobs, "rules": rules, "files": files}
+
+
+# Return the (seconds, rule name, file, bytes) of every pair in the report, slowest first.
+def slowest(report):
+    pairs = []
+    for entry in report["files"]:
+        for name, seconds in entry["rules"].items():
+            pairs.append((seconds, name, entry["file"], entry["bytes"]))
+    pairs.sort(key=lambda pair: pair[0], reverse=True)
+    return pairs
+
+
+def _rate(size, seconds):
+    return "%.1f MB/s" % (size / seconds / 1e6) if seconds > 0 else "-"
+
+
+def summary(report, top=10):
+    lines = ["Profile: %d files in %.2fs with %d jobs." % (len(report["files"]), report["wall"], report["jobs"])]
+    lines.append("%-28s %10s %12s %12s" % ("Rule", "Seconds", "MB", "Throughput"))
+    for name, total in sorted(report["rules"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+        lines.append("%-28s %10.3f %12.1f %12s" % (name, total["seconds"], total["bytes"] / 1e6, _rate(total["bytes"], total["seconds"])))
+    lines.append("Slowest %d rule runs:" % top)
+    for seconds, name, filename, size in slowest(report)[:top]:
+        lines.append("  %8.1f ms  %-28s %s (%d bytes, %s)" % (seconds * 1000, name, filename, size, _rate(size, seconds)))
+    return "\n".join(lines) + "\n"
+
+
+# Return the report in the collapsed stack format: one "lint;<rule>;<file> <microseconds>" line per pair.
+def collapsed(report):
+    lines = []
+    for entry in report["files"]:
+        # ";" separates the frames, and the weight follows the last space.
+        frame = entry["file"].replace(";", "_").replace(" ", "_")
+        for name, seconds in entry["rules"].items():
+            lines.append("lint;%s;%s %d" % (name, frame, round(seconds * 1e6)))
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def write(report, path, top=10, collapsed_path=None):
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=1)
+        fp.write("\n")
+    if collapsed_path:
+        with open(collapsed_path, "w", encoding="utf-8") as fp:
+            fp.write(collapsed(report))
+    sys.stderr.write(summary(report, top))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python3 scripts/lint_profile.py <profile.json>", file=sys.stderr)
+        return 2
+    with open(argv[0], "r", encoding="utf-8") as fp:
+        sys.stdout.write(collapsed(json.load(fp)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,671 @@
+# This module holds the rules used by the docs lint scripts, such as `check-tags.py` and `check-conflicts.py`.
+# Every rule is registered in `RULES` and is run by `lint_engine.py`, which reads each file once and passes the same `Document` to all selected rules.
+# A rule returns a list of JSON-serializable findings for a file and formats them exactly as the original standalone script printed them.
+
+import re
+import os
+import bisect
+import codecs
+import shutil
+import tempfile
+
+import lint_cache
+import md_regions
+
+RULES = {}
+
+
+# For registering a rule class under its `name`
+def register(rule_class):
+    RULES[rule_class.name] = rule_class()
+    return rule_class
+
+
+# Raised by a rule when the whole run must stop immediately, for example, on an unclosed code block.
+# The message is printed right after the file name.
+class FatalLintError(Exception):
+    pass
+
+
+class Rule:
+    name = None
+    # Printed once at the end of the run if any file fails this rule.
+    footer = None
+    # Whether the findings depend only on the file content, so they can be stored in the lint cache.
+    cacheable = True
+    # Whether each finding belongs to one line. In the `--since` mode, such findings are only reported on changed lines.
+    line_local = False
+
+    # Return the line number of a finding of a line-local rule.
+    def finding_line(self, finding):
+        return finding
+
+    def check(self, doc):
+        return []
+
+    def failed(self, findings):
+        return bool(findings)
+
+    def report(self, filename, findings):
+        return ""
+
+
+# Check manual line break within a paragraph.
+# `strict` enables the extra <pre><code>, <table>, <script> and MathJax toggles that `check-manual-line-breaks.py` uses,
+# while `file-format-lint.py` keeps its original, simpler patterns.
+def find_manual_breaks(lines, strict=True):
+
+    two_lines = []
+    metadata = 0
+    toggle = 0
+    ctoggle = 0
+    stoggle = 0
+    mathtoggle = 0
+    lineNum = 0
+    found = []
+
+    for line in lines:
+
+        lineNum += 1
+
+        # Check only website documents with YAML front matter. Requiring
+        # the opening delimiter on the first line prevents a later fenced
+        # example containing '---' from being mistaken for metadata.
+        if lineNum == 1:
+            if not re.fullmatch(r'\ufeff?---\s*', line):
+                return found
+            metadata = 1
+            continue
+        if metadata == 1:
+            if re.fullmatch(r'---\s*', line):
+                metadata = 2
+            continue
+
+        if metadata == 2:
+            # Skip tables and notes.
+            if re.match(r'(\s|\t)*(\||>)\s*\w*',line):
+                continue
+
+            if strict:
+                # Skip html tags and markdownlint tags.
+                if re.match(r'(\s|\t)*((<\/*(.*)>)|<!--|-->)\s*\w*',line):
+                    if re.match(r'(\s|\t)*(<pre><code>|<table>)',line):
+                        ctoggle = 1
+                    elif re.match(r'(\s|\t)*(<\/code><\/pre>|<\/table>)',line):
+                        ctoggle = 0
+                    else:
+                        continue
+
+                # Skip multi-line '<script' tags.
+                if re.match (r'\s*<\/*script',line):
+                    if re.match(r'\s*<script',line):
+                        stoggle = 1
+                    elif re.match(r'\s*</script>',line):
+                        stoggle = 0
+                    else:
+                        continue
+
+                # Skip image links.
+                if re.match(r'(\s|\t)*!\[.+\](\(.+\)|: [a-zA-z]+://[^\s]*)',line):
+                    continue
+
+                # Skip MathJax notations.
+                if re.match(r'\s*\$\$\s*$', line):
+                    mathtoggle = abs(1-mathtoggle)
+            else:
+                # Skip html tags and markdownlint tags.
+                if re.match(r'(\s|\t)*((<\/*\w+>)|<!--|-->)\s*\w*',line):
+                    continue
+
+                # Skip links and images.
+                if re.match(r'(\s|\t)*!*\[.+\](\(.+\)|: [a-zA-z]+://[^\s]*)',line):
+                    continue
+
+            # Set a toggle to skip code blocks.
+            if re.match(r'(\s|\t)*`{3}', line):
+                toggle = abs(1-toggle)
+
+            if toggle or ctoggle or stoggle or mathtoggle:
+                continue
+            else:
+                # Keep a record of the current line and the former line.
+                if len(two_lines)<1:
+                    two_lines.append(line)
+                    continue
+                elif len(two_lines) == 1:
+                    two_lines.append(line)
+                else:
+                    two_lines.append(line)
+                    two_lines.pop(0)
+
+                # Compare if there is a manual line break between the two lines.
+                if re.match(r'(\s|\t)*\n', two_lines[0]) or re.match(r'(\s|\t)*\n', two_lines[1]):
+                    continue
+                else:
+                    if re.match(r'(\s|\t)*(-|\+|(\d+|\w{1})\.|\*)\s*\w*',two_lines[0]) and re.match(r'(\s|\t)*(-|\+|\d+|\w{1}\.|\*)\s*\w*',two_lines[1]):
+                        continue
+
+                    found.append(lineNum)
+    return found
+
+
+@register
+class ManualLineBreakRule(Rule):
+    name = "manual-line-breaks"
+    line_local = True
+    footer = "\nThe above issues will cause website build failure. Please fix them."
+
+    def check(self, doc):
+        return find_manual_breaks(doc.lines)
+
+    def report(self, filename, findings):
+        out = "\n" + filename + ": this file has manual line breaks in the following lines:\n\n"
+        for lineNum in findings:
+            out += "MANUAL LINE BREAKS: L" + str(lineNum) + "\n"
+        return out
+
+
+# Check control characters. `numbered_lines` is an iterable of (line number, line).
+def find_control_chars(numbered_lines):
+    pos = []
+    for lineNum, line in numbered_lines:
+        if '\b' in line:
+            pos.append(lineNum)
+    return pos
+
+
+@register
+class ControlCharRule(Rule):
+    name = "control-char"
+    footer = "\nThe above issues will cause website build failure. Please fix them."
+    line_local = True
+
+    def check(self, doc):
+        return find_control_chars(doc.numbered_lines())
+
+    def report(self, filename, findings):
+        out = "\n" + filename + ": this file has control characters in the following lines:\n\n"
+        for cc in findings:
+            out += "CONTROL CHARACTERS: L" + str(cc) + "\n"
+        out += "\nPlease delete these control characters.\n"
+        return out
+
+
+CONFLICT_MARKERS = (b"<<<<<<<", b"=======", b">>>>>>>")
+
+
+# Return the number of line breaks in `buf[start:end]`. "\r\n", "\r" and "\n" each end a line, as with universal newlines.
+def _count_line_breaks(buf, start, end):
+    segment = buf[start:end]
+    return segment.count(b"\n") + segment.count(b"\r") - segment.count(b"\r\n")
+
+
+# Return the end of the line that contains `pos`, or -1 if it is the last line and has no line break.
+def _line_end(buf, pos):
+    lf = buf.find(b"\n", pos)
+    cr = buf.find(b"\r", pos, lf if lf >= 0 else len(buf))
+    return cr if cr >= 0 else lf
+
+
+# Find conflicts in the raw bytes of a file. `buf` can be `bytes` or an `mmap`.
+# The markers are ASCII, so they are searched with `find` without decoding the file, and lines are only counted up to each marker.
+# The result is the same as matching every line with `<{7}.*\n`, `={7}\n` and `>{7}`:
+# a list of [start line, end line] for each conflict, where the start line list also collects unpaired `<<<<<<<` lines.
+def find_conflicts(buf):
+    pos = []
+    single = []
+    flag = 0
+    lineNum = 1
+    counted = 0
+    # The next position of each marker, which may be in the middle of a line.
+    hits = [buf.find(marker) for marker in CONFLICT_MARKERS]
+    while True:
+        candidates = [hit for hit in hits if hit >= 0]
+        if not candidates:
+            break
+        hit = min(candidates)
+        kind = hits.index(hit)
+        hits[kind] = buf.find(CONFLICT_MARKERS[kind], hit + 1)
+        if hit > 0 and buf[hit - 1:hit] not in (b"\n", b"\r"):
+            continue
+
+        end = _line_end(buf, hit)
+        if kind == 0:
+            # `<{7}.*\n` requires a line break.
+            if end < 0:
+                continue
+        elif kind == 1:
+            if end != hit + 7:
+                continue
+        elif flag != 2:
+            continue
+
+        lineNum += _count_line_breaks(buf, counted, hit)
+        counted = hit
+        if kind == 0:
+            flag = 1
+            single.append(lineNum)
+        elif kind == 1:
+            flag = 2
+        else:
+            single.append(lineNum)
+            pos.append(single)
+            single = []
+            flag = 0
+    return pos
+
+
+@register
+class ConflictRule(Rule):
+    name = "conflicts"
+    footer = "The above conflicts will cause website build failure. Please fix them."
+
+    def check(self, doc):
+        return find_conflicts(doc.data)
+
+    def report(self, filename, findings):
+        out = "\n" + filename + ": this file has conflicts in the following lines:\n\n"
+        for conflict in findings:
+            if len(conflict) == 2:
+                out += "CONFLICTS: line " + str(conflict[0]) + " to line " + str(conflict[1]) + "\n\n"
+        return out
+
+
+_zh_punctuation = None
+
+# Return a pattern that matches the Chinese punctuation marks to report, and whether ASCII lines can be skipped.
+# `zhon` is imported on first use so that the other rules do not pay for it.
+def zh_punctuation_matcher():
+    global _zh_punctuation
+    if _zh_punctuation is None:
+        import zhon.hanzi
+
+        acceptable_punc = {'–', '—'} # em dash and en dash
+        marks = ''.join(sorted(set(zhon.hanzi.punctuation) - acceptable_punc))
+        _zh_punctuation = (re.compile('[' + re.escape(marks) + ']'), not any(mark.isascii() for mark in marks))
+    return _zh_punctuation
+
+# Check Chinese punctuation in English files. `numbered_lines` is an iterable of (line number, line).
+def find_zh_punctuation(numbered_lines):
+    pattern, skip_ascii = zh_punctuation_matcher()
+    found = []
+    for lineNum, line in numbered_lines:
+        # Chinese punctuation marks are non-ASCII characters, so most English lines are skipped here.
+        if skip_ascii and line.isascii():
+            continue
+        punc_inline = ''.join(pattern.findall(line))
+        if punc_inline != "":
+            found.append([lineNum, punc_inline])
+    return found
+
+
+@register
+class ZhPunctuationRule(Rule):
+    name = "zh-punctuation"
+    footer = "\nThe above issues will ruin your article. Please convert these marks into English punctuation."
+    line_local = True
+
+    def check(self, doc):
+        return find_zh_punctuation(doc.numbered_lines())
+
+    def finding_line(self, finding):
+        return finding[0]
+
+    def report(self, filename, findings):
+        out = "\n" + filename + ": this file has Chinese punctuation in the following lines:\n\n"
+        for lineNum, punc in findings:
+            out += "Chinese punctuation: L" + str(lineNum) + " has " + punc + "\n"
+        return out
+
+
+TAG_PATTERN = re.compile(r'</?[A-Za-z][A-Za-z0-9:-]*(?:\s[^>]*)?/?>')
+TAG_NAME_PATTERN = re.compile(r'</?\s*([A-Za-z][A-Za-z0-9:-]*)')
+
+# reference: https://stackoverflow.com/questions/35761133/python-how-to-check-for-open-and-close-tags
+def stack_tag(tag, stack):
+    tag_name_match = TAG_NAME_PATTERN.match(tag)
+    if tag_name_match is None:
+        return stack
+
+    tag_name = tag_name_match.group(1)
+    if tag.rstrip()[-2:] == '/>':
+        pass
+    elif tag[:2] != '</':
+        # Add tag to stack
+        stack.append(tag_name)
+    else:
+        if len(stack) != 0 and stack[-1] == tag_name:
+            # Close the block
+            stack.pop()
+
+    return stack
+
+# Return the tags of the content as (tag, start, end), without copyable shortcodes and URLs.
+# The content must have front matter, code blocks, inline code spans and HTML comments masked by `md_regions.mask_regions()`.
+def find_tags(content):
+    tags = []
+    for i in TAG_PATTERN.finditer(content):
+        tag = i.group()
+        pos = i.span()
+
+        if tag[:4] == '<!--' and tag[-3:] == '-->':
+            continue
+        elif content[pos[0]-2:pos[0]] == '{{' and content[pos[1]:pos[1]+2] == '}}':
+            # filter copyable shortcodes
+            continue
+        elif tag[:5] == '<http':
+            # filter urls
+            continue
+
+        tags.append((tag, pos[0], pos[1]))
+    return tags
+
+# Return the tags that are still open after the given tags from `find_tags()`.
+def unclosed_tags(tags):
+    stack = []
+    for tag, _, _ in tags:
+        stack = stack_tag(tag, stack)
+    return stack
+
+# Return the tags that are still open at the end of the content, which is masked as for `find_tags()`.
+def find_unclosed_tags(content):
+    return unclosed_tags(find_tags(content))
+
+
+TAG_ATTRIBUTE_PATTERN = re.compile(r'''([A-Za-z_:@][\w:.@-]*)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+
+# Return the attributes of a tag, such as {"platform": "tidb-cloud", "plan": "starter,essential"}. An attribute without a value is True.
+def parse_tag_attributes(tag):
+    attributes = {}
+    name = TAG_NAME_PATTERN.match(tag)
+    for i in TAG_ATTRIBUTE_PATTERN.finditer(tag, name.end(), len(tag) - 1):
+        values = [value for value in i.group(2, 3, 4) if value is not None]
+        attributes[i.group(1)] = values[0] if values else True
+    return attributes
+
+
+# Map character positions of the decoded text of a file to byte offsets in the file. The positions must be passed in increasing order.
+class _ByteOffsets:
+
+    def __init__(self, data, text):
+        self.text = text
+        self.ascii = data.isascii()
+        self.pos = 0
+        self.offset = 0
+        # The decoded text has "\n" for "\r\n", so every "\r\n" before a position adds one byte.
+        self.crlf = []
+        if b"\r\n" in data:
+            raw = data.decode("utf-8")
+            start = raw.find("\r\n")
+            while start != -1:
+                self.crlf.append(start - len(self.crlf))
+                start = raw.find("\r\n", start + 2)
+
+    def __call__(self, pos):
+        if self.ascii:
+            self.offset = pos
+        else:
+            self.offset += len(self.text[self.pos:pos].encode("utf-8"))
+        self.pos = pos
+        return self.offset + bisect.bisect_left(self.crlf, pos)
+
+
+# Return the tag tree of a file: the top-level nodes, in which each node is
+#     {"name": ..., "attrs": {...}, "start": ..., "end": ..., "inner": [start, end], "children": [...]}
+# The offsets are byte offsets in the file. "inner" is the content between the opening and closing tags, and is None for a self-closing tag.
+# Tags are paired the same way as `stack_tag()`. An unclosed tag has "end" None and the second "inner" offset None.
+# `tags` are from `find_tags()`, and `to_original` maps their positions in the masked content to the decoded text.
+def build_tag_tree(tags, to_original, data, text):
+    to_byte = _ByteOffsets(data, text)
+    roots = []
+    open_nodes = []
+    for tag, start, end in tags:
+        name = TAG_NAME_PATTERN.match(tag).group(1)
+        if tag[:2] == '</':
+            if len(open_nodes) != 0 and open_nodes[-1]["name"] == name:
+                node = open_nodes.pop()
+                node["inner"][1] = to_byte(to_original(start))
+                node["end"] = to_byte(to_original(end - 1) + 1)
+            continue
+
+        start = to_byte(to_original(start))
+        end = to_byte(to_original(end - 1) + 1)
+        node = {"name": name, "attrs": parse_tag_attributes(tag), "start": start, "end": end, "inner": None, "children": []}
+        (open_nodes[-1]["children"] if open_nodes else roots).append(node)
+        if tag.rstrip()[-2:] != '/>':
+            node["end"] = None
+            node["inner"] = [end, None]
+            open_nodes.append(node)
+    return roots
+
+
+# The tags of a document and the function that maps their positions back to the decoded text, shared by the "tags" and "tag-tree" rules.
+def _document_tags(doc):
+    content, to_original = md_regions.mask_regions_with_offsets(doc.text, doc.regions)
+    return find_tags(content), to_original
+
+
+def _unclosed_fence_error(e):
+    return FatalLintError(" : Some of your code blocks " + e.fence_char * 3 + " are not closed. Please close them.")
+
+
+# A tag that is not complete at the end of the text read so far: "<", "</", "<name", "<name/" or "<name attributes...".
+PARTIAL_TAG_PATTERN = re.compile(r'</?(?:[A-Za-z][A-Za-z0-9:-]*(?:\s[^>]*|/)?)?\Z')
+# The part of a tag with attributes that decides how the tag is handled, before its attributes.
+TAG_HEAD_PATTERN = re.compile(r'</?[A-Za-z][A-Za-z0-9:-]*\s')
+
+# Shorten the attributes of a tag that starts with TAG_HEAD_PATTERN, keeping the last `keep` characters.
+# The result is still matched by TAG_PATTERN and `stack_tag()` handles it in the same way.
+def _shorten_tag(tag, keep):
+    head = TAG_HEAD_PATTERN.match(tag)
+    if head is not None and len(tag) > head.end() + keep:
+        return tag[:head.end()] + tag[-keep:]
+    return tag
+
+
+# Find the tags of masked content that is fed piece by piece, with the same result as `find_unclosed_tags()` on the joined content.
+# Only the text after the last ">" is kept between pieces, and the attributes of an incomplete tag are shortened,
+# so the memory used does not depend on the content size.
+class TagScanner:
+
+    def __init__(self):
+        self.stack = []
+        # The text that is not scanned yet, and the two characters before it.
+        self.carry = ""
+        self.before = ""
+        # A tag whose following two characters are needed to check for a shortcode: (tag, whether "{{" precedes it).
+        self.pending = None
+
+    def copy(self):
+        scanner = TagScanner()
+        scanner.stack = list(self.stack)
+        scanner.carry = self.carry
+        scanner.before = self.before
+        scanner.pending = self.pending
+        return scanner
+
+    def _before(self, content, pos):
+        if pos >= 2:
+            return content[pos-2:pos]
+        return (self.before + content[:pos])[-2:]
+
+    def _add(self, tag, braces, after):
+        if braces and after == '}}':
+            # filter copyable shortcodes
+            return
+        elif tag[:5] == '<http':
+            # filter urls
+            return
+        self.stack = stack_tag(tag, self.stack)
+
+    def feed(self, text, eof=False):
+        content = self.carry + text
+        if self.pending is not None:
+            if len(content) < 2 and not eof:
+                self.carry = content
+                return
+            self._add(*self.pending, content[:2])
+            self.pending = None
+
+        # A tag ends at the first ">" after its start, so the tags before the last ">" are complete.
+        end = len(content) if eof else content.rfind('>') + 1
+        for i in TAG_PATTERN.finditer(content, 0, end):
+            pos = i.span()
+            braces = self._before(content, pos[0]) == '{{'
+            if pos[1] + 2 > len(content) and not eof:
+                self.pending = (_shorten_tag(i.group(), 2), braces)
+                self.before = self._before(content, pos[1])
+                self.carry = content[pos[1]:]
+                return
+            self._add(i.group(), braces, content[pos[1]:pos[1]+2])
+
+        partial = PARTIAL_TAG_PATTERN.search(content, end)
+        if partial is None:
+            self.before = self._before(content, len(content))
+            self.carry = ""
+        else:
+            self.before = self._before(content, partial.start())
+            self.carry = _shorten_tag(partial.group(), 1)
+
+    def finish(self):
+        self.feed("", eof=True)
+        return self.stack
+
+
+# Return the tags that are still open at the end of a file, the same as `find_unclosed_tags()`, reading the file line by line.
+# HTML comments are removed as the masked lines are read. While a comment is open, a copy of the scanner also reads the comment as text,
+# which is the result if the comment is never closed. Raise md_regions.UnclosedFenceError if a code block is not closed.
+def stream_unclosed_tags(filename):
+    scanner = TagScanner()
+    # The scanner for the case that the open comment is never closed.
+    unclosed = None
+    in_comment = False
+    for line in md_regions.stream_code_masked_lines(filename):
+        pos = 0
+        if in_comment:
+            end = line.find("-->")
+            if end == -1:
+                unclosed.feed(line)
+                continue
+            in_comment = False
+            unclosed = None
+            pos = end + 3
+        while True:
+            start = line.find("<!--", pos)
+            if start == -1:
+                scanner.feed(line[pos:])
+                break
+            scanner.feed(line[pos:start])
+            end = line.find("-->", start + 4)
+            if end == -1:
+                in_comment = True
+                unclosed = scanner.copy()
+                unclosed.feed(line[start:])
+                break
+            pos = end + 3
+    if in_comment:
+        return unclosed.finish()
+    return scanner.finish()
+
+
+@register
+class TagRule(Rule):
+    name = "tags"
+    footer = "HINT: Unclosed tags will cause website build failure. Please fix the reported unclosed tags. You can use backticks `` to wrap them or close them. Thanks."
+
+    def check(self, doc):
+        try:
+            if doc.streaming:
+                return stream_unclosed_tags(doc.filename)
+            tags, _ = doc.shared("tags", _document_tags)
+        except md_regions.UnclosedFenceError as e:
+            raise _unclosed_fence_error(e)
+        return unclosed_tags(tags)
+
+    def report(self, filename, findings):
+        stack = ['<' + i + '>' for i in findings]
+        return "ERROR: " + filename + ' has unclosed tags: ' + ', '.join(stack) + '.\n\n'
+
+
+# The tag tree of each file, for the tag index that `check-tags.py --tag-index` writes. See `build_tag_tree()`.
+# The findings are {"blob": hash of the file bytes, "tree": tag tree}. They are not stored in the lint cache, whose keys are the blobs in the
+# git index: with `core.autocrlf` or clean filters, those are other bytes than the bytes that the offsets of the tree refer to.
+@register
+class TagTreeRule(Rule):
+    name = "tag-tree"
+    cacheable = False
+
+    def check(self, doc):
+        try:
+            tags, to_original = doc.shared("tags", _document_tags)
+        except md_regions.UnclosedFenceError as e:
+            raise _unclosed_fence_error(e)
+        return {"blob": lint_cache.blob_hash(doc.data), "tree": build_tag_tree(tags, to_original, doc.data, doc.text)}
+
+    def failed(self, findings):
+        return False
+
+
+# Check whether a file starts with a UTF-8 BOM. Only the first three bytes are read.
+def has_BOM(filename):
+    with open(filename, "rb") as fp:
+        return fp.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+
+
+# Convert the file encoding to the default UTF-8 without BOM. Return True if the file is converted.
+# The content is copied to a temporary file that atomically replaces the original, so an interrupted run never leaves a half-shifted file.
+def remove_BOM(filename):
+    if not has_BOM(filename):
+        return False
+    fd, tmp_path = tempfile.mkstemp(prefix=".bom-", dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with open(filename, "rb") as src, os.fdopen(fd, "wb") as dst:
+            src.seek(len(codecs.BOM_UTF8))
+            shutil.copyfileobj(src, dst)
+        shutil.copymode(filename, tmp_path)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+# The following rules keep the output of `file-format-lint.py`, which differs slightly from the standalone checkers.
+
+@register
+class FormatBOMRule(Rule):
+    name = "format-bom"
+    cacheable = False
+
+    def check(self, doc):
+        if doc.data.startswith(codecs.BOM_UTF8) and remove_BOM(doc.filename):
+            return ["converted"]
+        return []
+
+    # Removing the BOM is a fix, not a failure.
+    def failed(self, findings):
+        return False
+
+    def report(self, filename, findings):
+        return "\n" + filename + ": this file's encoding has been converted to UTF-8 without BOM to avoid broken metadata display.\n"
+
+
+@register
+class FormatControlCharRule(ControlCharRule):
+    name = "format-control-char"
+
+    def report(self, filename, findings):
+        out = "\n" + filename + ": this file has control characters in the following lines:\n\n"
+        for cc in findings:
+            out += "CONTROL CHARACTERS IN L" + str(cc) + "\n"
+        out += "Please delete these control characters.\n"
+        return out
+
+
+@register
+class FormatManualLineBreakRule(ManualLineBreakRule):
+    name = "format-manual-line-breaks"
+
+    def check(self, doc):
+        return find_manual_breaks(doc.lines, strict=False)
@@ -0,0 +1,92 @@
+# This module implements the watch mode of `lint_engine.py` for writers who want feedback while editing.
+# It keeps the parsed `Document` and the last findings of every file in memory, polls the files for changes,
+# and checks only the saved file again. Press Ctrl+C to stop.
+
+import os
+import sys
+import time
+
+import lint_rules
+
+
+def _stat(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class FileState:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stat = None
+        self.doc = None
+        self.output = ""
+
+
+class Watcher:
+
+    def __init__(self, filenames, rules, document_class, out=sys.stdout):
+        self.rules = rules
+        self.document_class = document_class
+        self.out = out
+        self.files = {filename: FileState(filename) for filename in filenames}
+
+    # Check one file and return its report, which is empty if the file has no issues.
+    def check(self, state):
+        state.doc = self.document_class.from_file(state.filename)
+        output = ""
+        for rule in self.rules:
+            try:
+                findings = rule.check(state.doc)
+            except lint_rules.FatalLintError as e:
+                output += state.filename + str(e) + "\n"
+                break
+            if findings:
+                output += rule.report(state.filename, findings)
+        return output
+
+    # Check the files whose modification time or size changed. Return the number of checked files.
+    def poll(self, initial=False):
+        checked = 0
+        for state in self.files.values():
+            stat = _stat(state.filename)
+            if stat is None or stat == state.stat:
+                continue
+            state.stat = stat
+            start = time.perf_counter()
+            try:
+                output = self.check(state)
+            except (OSError, UnicodeDecodeError) as e:
+                output = state.filename + ": " + str(e) + "\n"
+            elapsed = (time.perf_counter() - start) * 1000
+            checked += 1
+
+            if initial:
+                self.out.write(output)
+            elif output:
+                self.out.write("\n[%s] %s changed, checked in %.0f ms:\n" % (time.strftime("%H:%M:%S"), state.filename, elapsed))
+                self.out.write(output)
+            elif state.output:
+                self.out.write("\n[%s] %s: all issues are fixed (%.0f ms).\n" % (time.strftime("%H:%M:%S"), state.filename, elapsed))
+            else:
+                self.out.write("[%s] %s: no issues (%.0f ms).\n" % (time.strftime("%H:%M:%S"), state.filename, elapsed))
+            state.output = output
+            self.out.flush()
+        return checked
+
+    def run(self, interval=0.2):
+        start = time.perf_counter()
+        self.poll(initial=True)
+        failing = sum(1 for state in self.files.values() if state.output)
+        self.out.write("\nWatching %d files (%d with issues, initial check took %.1fs). Press Ctrl+C to stop.\n"
+                       % (len(self.files), failing, time.perf_counter() - start))
+        self.out.flush()
+        try:
+            while True:
+                time.sleep(interval)
+                self.poll()
+        except KeyboardInterrupt:
+            return 0
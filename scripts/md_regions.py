@@ -0,0 +1,325 @@
+# This module finds the Markdown regions that the docs checkers must skip: front matter, fenced code blocks, inline code spans, HTML comments and shortcodes.
+# `scan_regions()` returns the regions as spans of the original text in linear time, and `mask_regions()` builds the filtered text in one pass.
+# The results are identical to the former `filter_frontmatter`, `filter_backticks` and `filter_html_comments` functions of `check-tags.py`:
+# code blocks and code spans are replaced by their newlines so that line numbers stay stable, while front matter and comments are removed.
+
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+Region = namedtuple("Region", ["kind", "start", "end"])
+
+FRONTMATTER = "frontmatter"
+FENCE = "fence"
+CODE = "code"
+COMMENT = "comment"
+SHORTCODE = "shortcode"
+
+FENCE_OPENER_PATTERN = re.compile(r'(?m)^[ \t]*(`{3,}|~{3,})[^\n]*\n?')
+# Any closing fence with the same character and at least three markers is accepted.
+FENCE_CLOSER_PATTERNS = {
+    "`": re.compile(r'(?m)^[ \t]*`{3,}[ \t]*$'),
+    "~": re.compile(r'(?m)^[ \t]*~{3,}[ \t]*$'),
+}
+BACKTICK_RUN_PATTERN = re.compile(r'`+')
+SHORTCODE_PATTERN = re.compile(r'\{\{<.*?>\}\}')
+
+
+class UnclosedFenceError(ValueError):
+
+    def __init__(self, fence_char, start):
+        super().__init__("code block " + fence_char * 3 + " is not closed")
+        self.fence_char = fence_char
+        self.start = start
+
+
+# Return the end of the front matter, or 0 if the text has no front matter.
+def find_frontmatter(text):
+    if not text.startswith("---\n"):
+        return 0
+    end = text.find("\n---\n", 4)
+    if end == -1:
+        return 0
+    return end + 5
+
+
+# Return the fenced code blocks as (start, end) spans. A block ends before the newline of its closing fence.
+def find_fences(text, pos=0):
+    fences = []
+    while True:
+        opener = FENCE_OPENER_PATTERN.search(text, pos)
+        if opener is None:
+            return fences
+        fence_char = opener.group(1)[0]
+        closer = FENCE_CLOSER_PATTERNS[fence_char].search(text, opener.end())
+        if closer is None:
+            raise UnclosedFenceError(fence_char, opener.start())
+        fences.append((opener.start(), closer.end()))
+        pos = closer.end()
+
+
+# Return the (start, end) of the next backtick run in text[pos:end], or None.
+def _next_run(text, pos, end):
+    start = text.find("`", pos, end)
+    if start == -1:
+        return None
+    return start, BACKTICK_RUN_PATTERN.match(text, start, end).end()
+
+
+# Return inline code spans in `segments`, which are the (start, end) parts of the text outside code blocks.
+# A span is closed by the next backtick run of exactly the same length. An unmatched run is kept as normal text.
+def find_code_spans(text, segments):
+    spans = []
+    # Once no closer of a length is found, no later run of that length can be closed either.
+    unmatched = set()
+    count = len(segments)
+    i = 0
+    pos = segments[0][0]
+    while i < count:
+        opener = _next_run(text, pos, segments[i][1])
+        if opener is None:
+            i += 1
+            if i < count:
+                pos = segments[i][0]
+            continue
+        ticks = opener[1] - opener[0]
+        pos = opener[1]
+        if ticks in unmatched:
+            continue
+
+        j = i
+        closer_pos = pos
+        while True:
+            closer = _next_run(text, closer_pos, segments[j][1])
+            if closer is None:
+                j += 1
+                if j == count:
+                    break
+                closer_pos = segments[j][0]
+            elif closer[1] - closer[0] == ticks:
+                break
+            else:
+                closer_pos = closer[1]
+        if closer is None:
+            unmatched.add(ticks)
+            continue
+        spans.append((opener[0], closer[1]))
+        i = j
+        pos = closer[1]
+    return spans
+
+
+# Build text with the given regions removed or replaced by their newlines. The regions must not overlap.
+# If `offsets` is a list, append the (original offset, masked offset) pairs where kept segments start.
+def _mask(text, regions, drop, blank, start=0, offsets=None):
+    parts = []
+    append = parts.append
+    length = 0
+    pos = start
+    for kind, region_start, region_end in regions:
+        if kind in blank:
+            newlines = "\n" * text.count("\n", region_start, region_end)
+        elif kind in drop:
+            newlines = ""
+        else:
+            continue
+        if offsets is not None:
+            offsets.append((pos, length))
+            length += region_start - pos + len(newlines)
+        append(text[pos:region_start])
+        append(newlines)
+        pos = region_end
+    if offsets is not None:
+        offsets.append((pos, length))
+    append(text[pos:])
+    return "".join(parts)
+
+
+# Return a function that maps a position in masked text to the position in the original text, using the offsets recorded by `_mask()`.
+def _offset_mapper(offsets):
+    masked_starts = [masked_offset for _, masked_offset in offsets]
+
+    def to_original(masked_pos):
+        i = bisect_right(masked_starts, masked_pos) - 1
+        return offsets[i][0] + masked_pos - offsets[i][1]
+
+    return to_original
+
+
+# Merge two sorted lists of regions, dropping the `inner` regions that lie within an `outer` region.
+def _merge_enclosing(outer, inner):
+    merged = []
+    i = 0
+    for region in outer:
+        while i < len(inner) and inner[i].start < region.start:
+            merged.append(inner[i])
+            i += 1
+        while i < len(inner) and inner[i].end <= region.end:
+            i += 1
+        merged.append(region)
+    merged.extend(inner[i:])
+    return merged
+
+
+# Return the regions of the text in order. Raise UnclosedFenceError if a code block is not closed.
+def scan_regions(text):
+    regions = []
+    body = find_frontmatter(text)
+    if body:
+        regions.append(Region(FRONTMATTER, 0, body))
+
+    fences = [Region(FENCE, start, end) for start, end in find_fences(text, body)]
+    segments = []
+    pos = body
+    for region in fences:
+        segments.append((pos, region.start))
+        pos = region.end
+    segments.append((pos, len(text)))
+    # A code span may run across code blocks, which are then part of the span.
+    spans = [Region(CODE, start, end) for start, end in find_code_spans(text, segments)]
+    code = _merge_enclosing(spans, fences)
+
+    # HTML comments are searched after code is masked, so comment markers in code are ignored.
+    offsets = []
+    masked = _mask(text, code, (), (FENCE, CODE), body, offsets)
+    to_original = _offset_mapper(offsets)
+
+    comments = []
+    pos = masked.find("<!--")
+    while pos != -1:
+        end = masked.find("-->", pos + 4)
+        if end == -1:
+            break
+        comments.append(Region(COMMENT, to_original(pos), to_original(end + 2) + 1))
+        pos = masked.find("<!--", end + 3)
+
+    # Code inside a comment is removed together with the comment.
+    merged = _merge_enclosing(comments, code)
+
+    # Shortcodes such as {{< copyable "sql" >}} outside of code and comments.
+    shortcodes = []
+    if "{{<" in text:
+        pos = body
+        for region in merged + [Region(None, len(text), len(text))]:
+            for match in SHORTCODE_PATTERN.finditer(text, pos, region.start):
+                shortcodes.append(Region(SHORTCODE, match.start(), match.end()))
+            pos = region.end
+
+    regions.extend(merged)
+    regions.extend(shortcodes)
+    regions.sort(key=lambda region: region.start)
+    return regions
+
+
+# Remove front matter and comments, and replace code blocks and code spans by their newlines.
+def mask_regions(text, regions, drop=(FRONTMATTER, COMMENT), blank=(FENCE, CODE)):
+    return _mask(text, regions, drop, blank)
+
+
+# The same as `mask_regions()`, and also return a function that maps positions in the masked text to the original text.
+def mask_regions_with_offsets(text, regions, drop=(FRONTMATTER, COMMENT), blank=(FENCE, CODE)):
+    offsets = []
+    masked = _mask(text, regions, drop, blank, 0, offsets)
+    return masked, _offset_mapper(offsets)
+
+
+# The following functions produce the same masked text line by line, for files that are too large to hold in memory.
+
+# Return the number of front matter lines at the start of `lines`, or 0 if there is no front matter.
+# Like `find_frontmatter()`, the closing "---" cannot be the second line.
+def count_frontmatter_lines(lines):
+    for lineNum, line in enumerate(lines, 1):
+        if lineNum == 1:
+            if line != "---\n":
+                return 0
+        elif lineNum > 2 and line == "---\n":
+            return lineNum
+    return 0
+
+
+# Return the last (line number, column) of each backtick run length outside code blocks, which tells whether a code span is closed.
+# Raise UnclosedFenceError if a code block is not closed.
+def _scan_backtick_runs(lines, body_lines):
+    last_runs = {}
+    fence_char = None
+    fence_start = 0
+    offset = 0
+    for lineNum, line in enumerate(lines, 1):
+        start = offset
+        offset += len(line)
+        if lineNum <= body_lines:
+            continue
+        if fence_char is not None:
+            if FENCE_CLOSER_PATTERNS[fence_char].match(line):
+                fence_char = None
+            continue
+        opener = FENCE_OPENER_PATTERN.match(line)
+        if opener is not None:
+            fence_char = opener.group(1)[0]
+            fence_start = start
+        elif "`" in line:
+            for run in BACKTICK_RUN_PATTERN.finditer(line):
+                last_runs[run.end() - run.start()] = (lineNum, run.start())
+    if fence_char is not None:
+        raise UnclosedFenceError(fence_char, fence_start)
+    return last_runs
+
+
+# Yield the lines of a file with front matter removed, and code blocks and code spans replaced by their newlines.
+# Joined together, the lines are the text that `scan_regions()` searches for comments.
+# The file is read line by line three times: for the front matter, for code blocks and backtick runs, and for the masked lines,
+# so the memory used does not depend on the file size. Raise UnclosedFenceError before yielding anything if a code block is not closed.
+def stream_code_masked_lines(filename):
+    with open(filename, "r", encoding="utf-8") as fp:
+        body_lines = count_frontmatter_lines(fp)
+    with open(filename, "r", encoding="utf-8") as fp:
+        last_runs = _scan_backtick_runs(fp, body_lines)
+
+    with open(filename, "r", encoding="utf-8") as fp:
+        fence_char = None
+        # The length of the open code span, or 0.
+        ticks = 0
+        for lineNum, line in enumerate(fp, 1):
+            if lineNum <= body_lines:
+                continue
+            newline = "\n" if line.endswith("\n") else ""
+            if fence_char is not None:
+                if FENCE_CLOSER_PATTERNS[fence_char].match(line):
+                    fence_char = None
+                yield newline
+                continue
+            opener = FENCE_OPENER_PATTERN.match(line)
+            if opener is not None:
+                fence_char = opener.group(1)[0]
+                yield newline
+                continue
+            if "`" not in line:
+                yield newline if ticks else line
+                continue
+
+            parts = []
+            pos = 0
+            end = len(line) - len(newline)
+            while pos < end:
+                run = _next_run(line, pos, end)
+                if ticks:
+                    # Look for the closing run of exactly the same length.
+                    if run is None:
+                        break
+                    pos = run[1]
+                    if run[1] - run[0] == ticks:
+                        ticks = 0
+                    continue
+                if run is None:
+                    parts.append(line[pos:end])
+                    break
+                parts.append(line[pos:run[0]])
+                pos = run[1]
+                length = run[1] - run[0]
+                # A span is closed if a run of the same length follows anywhere in the file.
+                if last_runs.get(length, (0, 0)) > (lineNum, run[0]):
+                    ticks = length
+                else:
+                    parts.append(line[run[0]:run[1]])
+            parts.append(newline)
+            yield "".join(parts)
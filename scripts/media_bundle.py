@@ -0,0 +1,120 @@
+# This module lists the images that a merged document references, and bundles them for the PDF build, so the build does not need the
+# whole media directory.
+# `merge_by_toc.py --media-manifest PATH` writes the media manifest: the images that the chapters reference after the platform and plan
+# filters, as `./media/...` links. The bundler then hardlinks, or copies, only those images into a bundle directory under names that are
+# the hash of their content, so byte-identical images are stored once, and rewrites the links of the merged document to the bundle.
+# Usage: python3 scripts/merge_by_toc.py TOC.md doc.md tidb --media-manifest media.json
+#        python3 scripts/media_bundle.py media.json doc.md [--bundle media-bundle] [--copy]
+# The Markdown files are rewritten in place, so they can be the shards of `merge_by_toc.py --shards` as well.
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+MANIFEST_FORMAT = 1
+# The image links of merged chapters, which merge_by_toc.py rewrites to `./media/...`, and the links that it leaves as `/media/...`.
+media_link_pattern = re.compile(r"\]\(((?:\./|/)media/[^)\s]+)")
+
+
+# Return the path of a media link relative to the docs root.
+def media_path(link):
+    return link[2:] if link.startswith("./") else link[1:]
+
+
+# Return the media paths of the links in `text`.
+def find_media(text):
+    if "media/" not in text:
+        return []
+    return [media_path(link) for link in media_link_pattern.findall(text)]
+
+
+def write_manifest(path, media, info):
+    entries = []
+    missing = []
+    for name in sorted(media):
+        if os.path.isfile(name):
+            entries.append({"path": name, "bytes": os.path.getsize(name)})
+        else:
+            missing.append(name)
+    manifest = dict(info, format=MANIFEST_FORMAT, media=entries, missing=missing)
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(manifest, fp, indent=1)
+        fp.write("\n")
+    return manifest
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Put the images of the manifest into `bundle` and return {media path: bundled path}. Images with the same content get the same file.
+def bundle_media(manifest, bundle, copy=False):
+    os.makedirs(bundle, exist_ok=True)
+    bundled = {}
+    for entry in manifest["media"]:
+        source = entry["path"]
+        target = os.path.join(bundle, file_hash(source) + os.path.splitext(source)[1].lower())
+        if not os.path.exists(target):
+            try:
+                if copy:
+                    raise OSError
+                os.link(source, target)
+            except OSError:
+                # Hardlinks do not work across file systems.
+                shutil.copyfile(source, target)
+        bundled[source] = target
+    return bundled
+
+
+# Rewrite the media links of a Markdown file to the bundled images, and return the number of rewritten links.
+def rewrite_links(filename, bundled):
+    count = 0
+
+    def replacer(match):
+        nonlocal count
+        target = bundled.get(media_path(match.group(1)))
+        if target is None:
+            return match.group(0)
+        count += 1
+        link = target.replace(os.sep, "/")
+        return "](" + (link if link.startswith(".") else "./" + link)
+
+    with open(filename, "r", encoding="utf-8") as fp:
+        text = fp.read()
+    text = media_link_pattern.sub(replacer, text)
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(text)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bundle the images of a merged document and rewrite its links to the bundle.")
+    parser.add_argument("manifest", help="the media manifest of merge_by_toc.py --media-manifest")
+    parser.add_argument("files", nargs="+", help="the merged Markdown files to rewrite in place")
+    parser.add_argument("--bundle", default="media-bundle", help="the bundle directory, relative to the docs root. Default: %(default)s")
+    parser.add_argument("--copy", action="store_true", help="copy the images instead of hardlinking them")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    with open(args.manifest, "r", encoding="utf-8") as fp:
+        manifest = json.load(fp)
+    for name in manifest.get("missing", []):
+        print("Missing image: " + name, file=sys.stderr)
+    bundled = bundle_media(manifest, os.path.relpath(args.bundle), args.copy)
+    links = sum(rewrite_links(filename, bundled) for filename in args.files)
+    files = set(bundled.values())
+    size = sum(os.path.getsize(path) for path in files)
+    print("Bundled %d images as %d files (%.1f MB) in %s, and rewrote %d links." % (len(bundled), len(files), size / 1e6, args.bundle, links),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
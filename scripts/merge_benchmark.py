@@ -0,0 +1,325 @@
+# This script benchmarks the stages of `merge_by_toc.py` on every TOC file and on a generated synthetic TOC.
+# Each TOC runs in its own subprocess, so that the peak memory is that of one build, and the fastest of `--repeat` runs is recorded.
+# A run calls the functions of merge_by_toc.py with `--jobs` as merge_by_toc.py does, and records the time of each stage: parsing the
+# TOC, loading the variables, scanning the chapters for the link table, and concatenating the chapters, which splits into reading,
+# transforming and writing them. It also records the slowest chapters. Another run on one job, with timers around the transformations,
+# records how the transform time splits into variables, links, copyable snippets, sticky header tables, headings, CustomContent and
+# heading levels. The timers add their own overhead, so the transformation times are only comparable with each other, not with the stage times.
+# Usage: python3 scripts/merge_benchmark.py [--tocs TOC.md,...] [--synthetic-chapters 2000] [--repeat 3] [-j N] [--output result.json]
+#                                           [--baseline baseline.json] [--threshold 0.2]
+# With `--baseline`, the script exits with 1 if any build is slower than the baseline by more than the threshold.
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import file_runner
+import lint_benchmark
+import merge_by_toc
+
+RESULT_FORMAT = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+SLOWEST_CHAPTERS = 10
+CHAPTERS_PER_SECTION = 20
+
+
+# Accumulate the time of named calls. Calls are only counted while `active` is set, so the scan stage does not count as transformations.
+class Timers:
+
+    def __init__(self):
+        self.seconds = {}
+        self.active = False
+
+    def add(self, name, seconds):
+        if self.active:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timed
+
+    # Time a generator that reads `lines` from another generator, without the time that the other generator takes.
+    def wrap_filter(self, name, func):
+        def timed(lines):
+            inner = [0.0]
+
+            def source():
+                iterator = iter(lines)
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        line = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        inner[0] += time.perf_counter() - start
+                    yield line
+
+            iterator = func(source())
+            while True:
+                start, before = time.perf_counter(), inner[0]
+                try:
+                    line = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add(name, time.perf_counter() - start - (inner[0] - before))
+                yield line
+        return timed
+
+
+# A compiled pattern whose `sub` is timed.
+class TimedPattern:
+
+    def __init__(self, timers, name, pattern):
+        self.sub = timers.wrap(name, pattern.sub)
+
+
+# Put timers around the transformations of merge_by_toc.py in this process.
+def install_timers(timers):
+    merge_by_toc.doc_variables.replace = timers.wrap("variables", merge_by_toc.doc_variables.replace)
+    merge_by_toc.replace_link_wrap = timers.wrap("links", merge_by_toc.replace_link_wrap)
+    merge_by_toc.copyable_snippet_pattern = TimedPattern(timers, "copyable", merge_by_toc.copyable_snippet_pattern)
+    merge_by_toc.remove_sticky_header_table = timers.wrap_filter("sticky-header-table", merge_by_toc.remove_sticky_header_table)
+    scanner = merge_by_toc.link_table.HeadingScanner
+    scanner.heading = timers.wrap("headings", scanner.heading)
+    for cls, name in ((merge_by_toc.CustomContentFilter, "custom-content"), (merge_by_toc.HeadingShifter, "heading-levels")):
+        cls.feed = timers.wrap(name, cls.feed)
+        cls.finish = timers.wrap(name, cls.finish)
+
+
+def peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+# A DocWriter that records the time of the writes.
+class TimedWriter(merge_by_toc.DocWriter):
+
+    def __init__(self, fp):
+        super().__init__(fp)
+        self.seconds = 0.0
+
+    def append(self, part):
+        start = time.perf_counter()
+        try:
+            super().append(part)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+# Build one merged document with the functions of merge_by_toc.py, and return the timings of the stages.
+def run_pipeline(entry_file, custom_content_platform, plan, target, jobs=1, timers=None):
+    stages = {}
+    start = time.perf_counter()
+    followups = merge_by_toc.parse_toc(entry_file)
+    stages["parse-toc"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    variables = merge_by_toc.load_variables()
+    stages["variables"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table, headings, _ = merge_by_toc.build_link_table(followups, variables, jobs)
+    stages["scan"] = time.perf_counter() - start
+
+    timings = []
+    start = time.perf_counter()
+    if timers is not None:
+        timers.active = True
+    try:
+        with open(target, "w") as fp:
+            writer = TimedWriter(fp)
+            merge_by_toc.concat_files(followups, writer, variables, custom_content_platform, table, headings, jobs, plan, timings=timings)
+    finally:
+        if timers is not None:
+            timers.active = False
+    stages["concat"] = time.perf_counter() - start
+
+    # With more than one job, the read and transform times are the sums of the times in the workers.
+    concat_parts = {
+        "read": sum(timing[1] for timing in timings),
+        "transform": sum(timing[2] for timing in timings),
+        "write": writer.seconds,
+    }
+    chapters = sorted(((transform, name, size) for name, _, transform, size in timings), reverse=True)
+    result = {
+        "seconds": sum(stages.values()),
+        "jobs": file_runner.resolve_jobs(jobs),
+        "stages": stages,
+        "concat_parts": concat_parts,
+        "chapters": len(chapters),
+        "bytes": sum(timing[3] for timing in timings),
+        "output_bytes": os.path.getsize(target),
+        "peak_rss_mb": peak_rss_mb(),
+        "slowest": [{"file": name, "seconds": seconds, "bytes": length} for seconds, name, length in chapters[:SLOWEST_CHAPTERS]],
+    }
+    if timers is not None:
+        transformations = dict(timers.seconds)
+        transformations["other"] = max(0.0, concat_parts["transform"] - sum(transformations.values()))
+        result["transformations"] = transformations
+    return result
+
+
+# Run one build in a subprocess and return its result, or an error.
+def time_build(entry_file, custom_content_platform, plan, cwd, workdir, jobs=1, instrument=False):
+    target = os.path.join(workdir, "doc.md")
+    command = [sys.executable, os.path.join(HERE, "merge_benchmark.py"), "--run", entry_file, custom_content_platform, plan, target,
+               "--jobs", str(jobs)]
+    if instrument:
+        command.append("--instrument")
+    p = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8")
+    if p.returncode != 0:
+        error = p.stderr.strip().splitlines()
+        return {"error": error[-1] if error else "exit code " + str(p.returncode)}
+    return json.loads(p.stdout)
+
+
+# Return the platform and plan that a TOC file is built for.
+def toc_target(entry_file):
+    name = os.path.splitext(os.path.basename(entry_file))[0]
+    custom_content_platform = "tidb-cloud" if "cloud" in name else "tidb"
+    plan = name.rsplit("-", 1)[-1]
+    return custom_content_platform, plan if plan in merge_by_toc.PLANS else merge_by_toc.DEFAULT_PLAN
+
+
+# Write a synthetic TOC of `chapters` generated chapters in nested sections to `directory`, and return the TOC file name.
+def generate_toc(directory, chapters, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "synthetic"), exist_ok=True)
+    lines = ["<!-- markdownlint-disable MD007 -->\n", "<!-- markdownlint-disable MD041 -->\n", "\n", "- Synthetic\n"]
+    for index in range(chapters):
+        if index % CHAPTERS_PER_SECTION == 0:
+            lines.append("  - Section %d\n" % (index // CHAPTERS_PER_SECTION))
+        name = "synthetic/synthetic-%05d.md" % index
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as fp:
+            fp.write(lint_benchmark.synthetic_document(rng, index))
+        lines.append("    " * (1 + index % 2) + "- [Synthetic document %d](/%s)\n" % (index, name))
+    toc = os.path.join(directory, "TOC-synthetic.md")
+    with open(toc, "w", encoding="utf-8") as fp:
+        fp.writelines(lines)
+    return toc
+
+
+def print_result(key, result):
+    if "error" in result:
+        print("%-50s skipped: %s" % (key, result["error"]))
+        return
+    stages = " ".join("%s=%.3f" % (name, seconds) for name, seconds in result["stages"].items())
+    print("%-50s %8.3fs %7.1f MB  %s" % (key, result["seconds"], result["peak_rss_mb"], stages))
+    print("%-50s %s" % ("", " ".join("%s=%.3f" % item for item in result["concat_parts"].items())))
+    if "transformations" in result:
+        print("%-50s %s" % ("", " ".join("%s=%.3f" % item for item in sorted(result["transformations"].items(), key=lambda item: -item[1]))))
+
+
+# Benchmark one TOC: the fastest of `repeat` runs, with the transformation times of one instrumented run.
+def benchmark_toc(entry_file, cwd, workdir, repeat, jobs=1):
+    custom_content_platform, plan = toc_target(entry_file)
+    runs = []
+    for _ in range(repeat):
+        result = time_build(entry_file, custom_content_platform, plan, cwd, workdir, jobs)
+        if "error" in result:
+            return result
+        runs.append(result)
+    best = min(runs, key=lambda run: run["seconds"])
+    best["runs"] = [run["seconds"] for run in runs]
+    best["platform"] = custom_content_platform
+    best["plan"] = plan
+    # The timers only see the transformations in this process, so the instrumented run uses one job.
+    instrumented = time_build(entry_file, custom_content_platform, plan, cwd, workdir, 1, instrument=True)
+    if "transformations" in instrumented:
+        best["transformations"] = instrumented["transformations"]
+    return best
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of merge_by_toc.py on the TOC files and on a synthetic TOC.")
+    parser.add_argument("--tocs", help="comma-separated TOC files. Default: all TOC*.md files")
+    parser.add_argument("--synthetic-chapters", type=int, default=2000,
+                        help="number of chapters of the synthetic TOC. 0 skips it. Default: %(default)s")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each build, of which the fastest is recorded. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic chapters. Default: %(default)s")
+    parser.add_argument("--workdir", help="directory for the synthetic TOC and the output, which is kept. Default: a temporary directory that is removed")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the results with this JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction by which a build may be slower than the baseline before it counts as a regression. Default: %(default)s")
+    file_runner.add_jobs_argument(parser)
+    # One build in this process, for the subprocesses of the benchmark.
+    parser.add_argument("--run", nargs=4, metavar=("TOC", "PLATFORM", "PLAN", "TARGET"), help=argparse.SUPPRESS)
+    parser.add_argument("--instrument", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.run:
+        timers = None
+        if args.instrument:
+            timers = Timers()
+            install_timers(timers)
+        # The result is written to stdout, so the messages of merge_by_toc.py go to stderr.
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_pipeline(*args.run, jobs=args.jobs, timers=timers)
+        json.dump(result, sys.stdout)
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="merge-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    tocs = [toc.strip() for toc in args.tocs.split(",") if toc.strip()] if args.tocs else sorted(glob.glob("TOC*.md"))
+    report = {
+        "format": RESULT_FORMAT,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {},
+    }
+    try:
+        for toc in tocs:
+            result = benchmark_toc(toc, os.getcwd(), os.path.abspath(workdir), args.repeat, args.jobs)
+            report["results"][toc] = result
+            print_result(toc, result)
+        if args.synthetic_chapters > 0:
+            toc = generate_toc(workdir, args.synthetic_chapters, args.seed)
+            key = "synthetic-%d" % args.synthetic_chapters
+            result = benchmark_toc(os.path.basename(toc), os.path.abspath(workdir), os.path.abspath(workdir), args.repeat, args.jobs)
+            report["results"][key] = result
+            print_result(key, result)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+            fp.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        regressions = lint_benchmark.compare(report["results"], baseline, args.threshold)
+        for key, base, seconds in regressions:
+            print("REGRESSION: %s took %.3fs, %.0f%% slower than the baseline %.3fs." % (key, seconds, (seconds / base - 1) * 100, base))
+        if regressions:
+            return 1
+        print("No build is more than %.0f%% slower than the baseline." % (args.threshold * 100))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
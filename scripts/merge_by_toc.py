@@ -4,176 +4,203 @@
 # Generate all-in-one Markdown file for ``doc-cn``
 # Tip: 不支持中文文件名
 # readme.md 中的目录引用的md多次（或者md的sub heading)，以第一次出现为主
+#
+# Usage: python3 scripts/merge_by_toc.py [TOC.md] [doc.md] [tidb|tidb-cloud] [--plan PLAN] [-j N]
+#        python3 scripts/merge_by_toc.py --output-dir DIR [--tocs TOC.md,...] [--platforms ...] [--plans ...] [-j N]
+#        python3 scripts/merge_by_toc.py [TOC.md] [doc.md] [tidb|tidb-cloud] --shards DIR, then python3 scripts/render_shards.py DIR
+# All modes take [--cache PATH] to reuse the transformed chapters of unchanged chapters. See chapter_cache.py.
 
 from __future__ import print_function, unicode_literals
 
+import argparse
+import glob
 import re
 import os
 import sys
 import json
-import unicodedata
+import time
+
+import chapter_cache
+import doc_variables
+import file_runner
+import link_table
+import media_bundle
+import md_regions
 
-followups = []
-in_toc = False
-contents = []
-in_allowlist = False
 
 hyper_link_pattern = re.compile(r"\[(.*?)\]\((.*?)(#.*?)?\)")
 toc_line_pattern = re.compile(r"([\-\+]+)\s\[(.*?)\]\((.*?)(#.*?)?\)")
 image_link_pattern = re.compile(r"!\[(.*?)\]\((.*?)\)")
 level_pattern = re.compile(r"(\s*[\-\+]+)\s")
-# match all headings
-heading_patthern = re.compile(r"(^#+|\n#+)\s")
+# match the hashes of a heading at the start of a line
+heading_pattern = re.compile(r"(#+)\s")
 # match copyable snippet code
 copyable_snippet_pattern = re.compile(r"{{< copyable .* >}}")
-custom_content_tidb = re.compile(
-    r"""<CustomContent[^>]*platform=["']tidb["'][^>]*>(.|\n)*?</CustomContent>"""
-)
-custom_content_tidb_cloud = re.compile(
-    r"""<CustomContent[^>]*platform=["']tidb-cloud["'][^>]*>(.|\n)*?</CustomContent>"""
-)
-# Match CustomContent with plan attribute, capturing the plan value and content
-custom_content_with_plan = re.compile(
-    r"""<CustomContent[^>]+plan=["']([^"']+)["'][^>]*>(.|\n)*?</CustomContent>"""
-)
-
-sysArgvList = sys.argv
-
-try:
-    entry_file = sys.argv[1]
-except IndexError:
-    entry_file = "TOC.md"
+# match the opening and closing CustomContent tags. An opening tag can span lines.
+custom_content_tag_pattern = re.compile(r"<CustomContent[^>]*>|</CustomContent>")
+# The opening tags of the CustomContent blocks that are removed for each platform:
+# Cloud specified content should not render in tidb pdf, and TiDB specified content should not render in tidb-cloud pdf
+excluded_platform_patterns = {
+    "tidb": re.compile(r"""platform=["']tidb-cloud["']"""),
+    "tidb-cloud": re.compile(r"""platform=["']tidb["']"""),
+}
+# Match the opening tag of CustomContent with plan attribute, capturing the plan value
+custom_content_plan_pattern = re.compile(r"""<CustomContent[^>]+plan=["']([^"']+)["'][^>]*>""")
+PLATFORMS = ["tidb", "tidb-cloud"]
+PLANS = ["starter", "essential", "dedicated", "premium"]
+DEFAULT_PLAN = "dedicated"
+SHARD_MANIFEST = "manifest.json"
+SHARD_MANIFEST_FORMAT = 1
+
+# An ordered set of TOC entries: the entries keep the TOC order, and a membership test is O(1).
+class Followups:
+
+    def __init__(self):
+        self.entries = []
+        self.keys = set()
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, key):
+        self.entries.append(key)
+        self.keys.add(key)
+
+    # Append the entry if it is not in the TOC yet.
+    def add(self, key):
+        if key not in self.keys:
+            self.append(key)
+
 
 # stage 1, parse toc
-with open(entry_file) as fp:
-    level = 0
-    current_level = ""
-    for line in fp:
-        if not in_toc and not line.startswith("<!-- "):
-            in_toc = True
-        elif line.strip() == "## _BUILD_ALLOWLIST":
-            in_allowlist = True
-        elif in_allowlist and line.startswith("#"):
-            in_allowlist = False
-        elif in_toc and not line.startswith("#") and line.strip():
-            # Skip processing if we're in the allowlist section
-            if in_allowlist:
-                continue
+def parse_toc(entry_file):
+    followups = Followups()
+    in_toc = False
+    in_allowlist = False
+    with open(entry_file) as fp:
+        level = 0
+        for line in fp:
+            if not in_toc and not line.startswith("<!-- "):
+                in_toc = True
+            elif line.strip() == "## _BUILD_ALLOWLIST":
+                in_allowlist = True
+            elif in_allowlist and line.startswith("#"):
+                in_allowlist = False
+            elif in_toc and not line.startswith("#") and line.strip():
+                # Skip processing if we're in the allowlist section
+                if in_allowlist:
+                    continue
+
+                ## get level from space length
+                level_space_str = level_pattern.findall(line)[0][:-1]
+                level = len(level_space_str) // 2 + 1  ## python divide get integer
+
+                matches = toc_line_pattern.findall(line)
+                if matches:
+                    for match in matches:
+                        fpath = match[2]
+                        if fpath.endswith(".md"):
+                            # remove the first slash in the relative path
+                            fpath = fpath[1:]
+                            followups.add(("FILE", level, fpath))
+                        elif fpath.startswith("http"):
+                            ## remove list format character `- `, `+ `
+                            followups.append(("TOC", level, line.strip()[2:]))
+                else:
+                    name = line.strip().split(None, 1)[-1]
+                    followups.add(("TOC", level, name))
 
-            ## get level from space length
-            level_space_str = level_pattern.findall(line)[0][:-1]
-            level = len(level_space_str) // 2 + 1  ## python divide get integer
-
-            matches = toc_line_pattern.findall(line)
-            if matches:
-                for match in matches:
-                    fpath = match[2]
-                    if fpath.endswith(".md"):
-                        # remove the first slash in the relative path
-                        fpath = fpath[1:]
-                        key = ("FILE", level, fpath)
-                        if key not in followups:
-                            followups.append(key)
-                    elif fpath.startswith("http"):
-                        ## remove list format character `- `, `+ `
-                        followups.append(("TOC", level, line.strip()[2:]))
             else:
-                name = line.strip().split(None, 1)[-1]
-                key = ("TOC", level, name)
-                if key not in followups:
-                    followups.append(key)
-
-        else:
-            pass
-
-# stage 2, get file heading
-file_link_name = {}
-title_pattern = re.compile(r"(^#+)\s.*")
-for tp, lv, f in followups:
-    if tp != "FILE":
-        continue
+                pass
+    return followups
+
+# stage 2, build the link table from the headings of all chapters
+# Return the source anchors, the content hash, the opening CustomContent tags and the unresolved variables of a chapter.
+def scan_chapter(text, variables):
+    unresolved = []
+    chapter = doc_variables.replace(text, variables, unresolved) if "{{{" in text else text
+    tags = []
+    if "CustomContent" in chapter:
+        tags = [tag for tag in custom_content_tag_pattern.findall(chapter) if tag != "</CustomContent>"]
+    return link_table.source_anchors(chapter), chapter_cache.content_hash(text), tags, unresolved
+
+
+def scan_file(task):
+    name, variables = task
     try:
-        for line in open(f).readlines():
-            if line.startswith("#"):
-                tag = line.strip()
-                break
-    except Exception as e:
-        print(e)
-        tag = ""
-    if tag.startswith("# "):
-        tag = tag[2:]
-    elif tag.startswith("## "):
-        tag = tag[3:]
-    file_link_name[f] = tag.lower().replace(" ", "-")
-
+        with open(name) as fp:
+            text = fp.read()
+    except Exception:
+        # The error is reported when the chapter is transformed.
+        return [], None, [], []
+    return scan_chapter(text, variables)
+
+
+# Return the link table, the heading anchors of each chapter in TOC order, and the (content hash, CustomContent tags, unresolved variables)
+# of each chapter.
+def build_link_table(followups, variables, jobs=1):
+    names = [name for type_, level, name in followups if type_ == "FILE"]
+    tasks = [(name, variables) for name in names]
+    scans = list(file_runner.imap_files(scan_file, tasks, jobs))
+    table, headings = fill_link_table(names, (scan[0] for scan in scans))
+    return table, headings, [scan[1:] for scan in scans]
+
+
+# Add the source anchors of each chapter to a new link table in TOC order.
+def fill_link_table(names, source_anchor_lists):
+    table = link_table.LinkTable()
+    headings = []
+    for name, anchors in zip(names, source_anchor_lists):
+        headings.append(table.add_file(name, anchors))
+    return table, headings
+
+# Return the variables of variables.json flattened into {dotted path: text}, the `variables` of the other functions. See doc_variables.py.
 def load_variables():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    variables_path = os.path.join(current_dir, "../variables.json")
-    try:
-        with open(variables_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        return {}
-variable_pattern = re.compile(r"{{{\s*\.(.+?)\s*}}}")
-
-def get_value_by_path(obj, path):
-    keys = path.split(".")
-    for key in keys:
-        if isinstance(obj, dict) and key in obj:
-            obj = obj[key]
-        else:
-            return ""
-    return str(obj)
-
-def replace_variables(text, variables):
-    def replacer(match):
-        path = match.group(1).strip()
-        value = get_value_by_path(variables, path)
-        return str(value) if value != "" else match.group(0)
-    return variable_pattern.sub(replacer, text)
-
-def slugify(title):
-    slug = title.strip().lower()
-    slug = unicodedata.normalize('NFKD', slug)
-    slug = re.sub(r"[^\w\s-]", "", slug)  # remove punctuation
-    slug = re.sub(r"[\s_]+", "-", slug)   # spaces and underscores to dash
-    return slug
-
-custom_id_map = {}  # key = custom-id, value = slugified title
-
-heading_with_custom_id_pattern = re.compile(r"^(#+)\s+(.*?)(?:\s+\{#([^\}]+)\})?$", re.MULTILINE)
-
-def extract_custom_ids_and_clean(chapter):
-    def repl(match):
-        hashes = match.group(1)
-        title = match.group(2).strip()
-        custom_id = match.group(3)
-
-        if custom_id:
-            anchor = slugify(title)
-            custom_id_map[custom_id] = anchor
-            return f"{hashes} {title}"  # remove the `{#...}`
-        else:
-            return match.group(0)
+    return doc_variables.flatten(doc_variables.load())
+
+
+# Exit before anything is written if a chapter has variables that are not in variables.json, so that release builds do not ship them.
+def check_unresolved(names, unresolved_lists):
+    missing = {}
+    for name, unresolved in zip(names, unresolved_lists):
+        if unresolved:
+            missing[name] = unresolved
+    for name, unresolved in missing.items():
+        for path in unresolved:
+            print("%s: unresolved variable {{{ .%s }}}" % (name, path), file=sys.stderr)
+    if missing:
+        raise SystemExit("%d files have unresolved variables." % len(missing))
+
+anchor_table = link_table.LinkTable()  # the link table of the merged document
+
+
+# A link table that records the lookups of a chapter, so that the chapter can be reused, from the chapter cache or for another table, with the same answers.
+class RecordingTable:
 
-    return heading_with_custom_id_pattern.sub(repl, chapter)
+    def __init__(self, table):
+        self.table = table
+        self.lookups = {}
 
-def replace_custom_id_links(content):
-    # [text](/path#custom-id) → [text](#anchor-text)
-    def repl(match):
-        text, url, frag = match.group(1), match.group(2), match.group(3)
-        if frag and frag.startswith("#"):
-            cid = frag[1:]
-            if cid in custom_id_map:
-                return f"[{text}](#{custom_id_map[cid]})"
-        return match.group(0)
+    def resolve(self, name, anchor=""):
+        result = self.table.resolve(name, anchor)
+        self.lookups[(name, anchor)] = result
+        return result
 
-    return hyper_link_pattern.sub(repl, content)
+
+
+# Return the path of a linked file as it is in the TOC, for links relative to the docs root or to the chapter.
+def link_target(name, link):
+    if link.startswith("/"):
+        return link[1:]
+    return os.path.normpath(os.path.join(os.path.dirname(name), link))
 
 def replace_link_wrap(chapter, name):
 
-    # Note: 仅仅支持 hash 匹配，如果在多个文档中有同名 heading 会碰撞
-    # 支持 chapter 文档中的 ./ddd.md, xxx.md, xxx.md#xxx 等
+    # 支持 chapter 文档中的 /ddd.md, ./ddd.md, xxx.md, xxx.md#xxx, #xxx 等
+    # The anchors come from the link table, so a heading with the same name in another chapter is not linked by mistake.
     def replace_link(match):
         full = match.group(0)
         link_name = match.group(1)
@@ -182,12 +209,13 @@ def replace_link_wrap(chapter, name):
         if link.startswith("http"):
             return full
         elif link.endswith(".md") or ".md#" in link:
-            if not frag:
-                link = link[1:]
-                for fpath in file_link_name:
-                    if link == fpath:
-                        frag = "#" + file_link_name[fpath]
+            anchor = anchor_table.resolve(link_target(name, link), frag[1:] if frag else "")
+            if anchor is not None:
+                frag = "#" + anchor
             return "[%s](%s)" % (link_name, frag)
+        elif not link and frag:
+            anchor = anchor_table.resolve(name, frag[1:])
+            return "[%s](#%s)" % (link_name, anchor) if anchor is not None else full
         elif (
             link.endswith(".png")
             or link.endswith(".jpeg")
@@ -204,102 +232,544 @@ def replace_link_wrap(chapter, name):
     return hyper_link_pattern.sub(replace_link, chapter)
 
 
-def replace_heading_func(diff_level=0):
-    def replace_heading(match):
-        if diff_level == 0:
-            return match.group(0)
-        else:
-            return "\n" + "#" * (match.group(0).count("#") + diff_level) + " "
+# remove <StickyHeaderTable> / </StickyHeaderTable> tags for PDF output
+sticky_header_table_pattern = re.compile(r'^\s*</?StickyHeaderTable\s*/?>\s*$')
 
-    return replace_heading
 
+# Yield the lines without the <StickyHeaderTable> tags. A tag line after a blank line is removed together with the blank line after it.
+def remove_sticky_header_table(lines):
+    prev_blank = False
+    skip_blank = False
+    for line in lines:
+        if skip_blank:
+            skip_blank = False
+            if line.strip() == "":
+                continue
+        if "StickyHeaderTable" in line and sticky_header_table_pattern.match(line):
+            skip_blank = prev_blank
+            continue
+        prev_blank = line.strip() == ""
+        yield line
+
+
+# Filter <CustomContent platform="xxx"> and <CustomContent plan="xxx"> blocks. The text is fed in pieces and the kept text is returned.
+# A removed block ends at its own closing tag, so nested blocks are removed together with their parent.
+# A block that is not closed is not a block, so it is kept.
+class CustomContentFilter:
+
+    def __init__(self, custom_content_platform, plan=DEFAULT_PLAN):
+        self.excluded_platform = excluded_platform_patterns.get(custom_content_platform)
+        self.plan = plan
+        self.depth = 0  # nesting depth in the removed block
+        self.removed = []
+        self.partial = ""  # an opening tag that continues in the next piece
+
+    # Only keep content with the plan in the plan attribute
+    def keep(self, tag):
+        if self.excluded_platform and self.excluded_platform.search(tag):
+            return False
+        match = custom_content_plan_pattern.match(tag)
+        if match:
+            plans = [p.strip() for p in match.group(1).split(",")]
+            return self.plan in plans
+        return True
+
+    def feed(self, text):
+        text = self.partial + text
+        self.partial = ""
+        if "CustomContent" not in text:
+            if self.depth:
+                self.removed.append(text)
+                return ""
+            return text
+        tag_start = text.rfind("<CustomContent")
+        if tag_start >= 0 and ">" not in text[tag_start:]:
+            self.partial = text[tag_start:]
+            text = text[:tag_start]
+        kept = []
+        pos = 0
+        for match in custom_content_tag_pattern.finditer(text):
+            tag = match.group(0)
+            if self.depth:
+                self.removed.append(text[pos:match.end()])
+                self.depth += -1 if tag == "</CustomContent>" else 1
+                if not self.depth:
+                    self.removed = []
+            else:
+                kept.append(text[pos:match.start()])
+                if tag == "</CustomContent>" or self.keep(tag):
+                    kept.append(tag)
+                else:
+                    self.depth = 1
+                    self.removed = [tag]
+            pos = match.end()
+        (self.removed if self.depth else kept).append(text[pos:])
+        return "".join(kept)
+
+    def finish(self):
+        text = self.partial
+        self.partial = ""
+        if self.depth:
+            opening_tag, removed = self.removed[0], "".join(self.removed[1:])
+            self.depth = 0
+            self.removed = []
+            text = opening_tag + self.feed(removed + text) + self.finish()
+        return text
+
+
+# Return which of the opening tags the platform and plan keep. Outputs with the same decisions get the same chapter.
+def filter_signature(tags, custom_content_platform, plan):
+    content_filter = CustomContentFilter(custom_content_platform, plan)
+    return tuple(content_filter.keep(tag) for tag in tags)
+
+
+# Shift the headings of a chapter to its level in the TOC. The first heading decides how many levels the headings are shifted.
+# Lines in code blocks are not headings. The text is fed in pieces, and the result is in `parts`.
+class HeadingShifter:
+
+    def __init__(self, level):
+        self.level = level
+        self.diff_level = None
+        self.fence_char = None
+        self.parts = []
+        self.pending = ""
+        self.first = True
+        # The newline before the line was replaced together with a heading that has no title.
+        self.joined = False
+
+    def feed(self, text):
+        lines = (self.pending + text).split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self.shift_line(line, "\n")
+
+    def finish(self):
+        self.shift_line(self.pending, "")
+        self.pending = ""
+        if self.diff_level is None:
+            raise ValueError("no heading found")
+        return "".join(self.parts)
+
+    def shift_line(self, line, newline):
+        first, joined = self.first, self.joined
+        self.first = self.joined = False
+        if joined:
+            pass  # the line is the title of the heading before it
+        elif self.fence_char is not None:
+            if md_regions.FENCE_CLOSER_PATTERNS[self.fence_char].match(line):
+                self.fence_char = None
+        elif line.startswith("#"):
+            match = heading_pattern.match(line + newline)
+            if match:
+                hashes = len(match.group(1))
+                if self.diff_level is None:
+                    self.diff_level = self.level - hashes
+                if self.diff_level != 0:
+                    if match.end() > len(line):
+                        # The whitespace after the `#` is the newline.
+                        newline = ""
+                        self.joined = True
+                    line = "#" * (hashes + self.diff_level) + " " + line[match.end():]
+                    if first:
+                        line = "\n" + line
+        elif "``" in line or "~~" in line:
+            opener = md_regions.FENCE_OPENER_PATTERN.match(line)
+            if opener:
+                self.fence_char = opener.group(1)[0]
+        self.parts.append(line)
+        self.parts.append(newline)
+
+
+# Variables, links and copyable snippets, which are replaced on each line.
+def prepare_line(line, name, variables):
+    if "{{{" in line:
+        line = doc_variables.replace(line, variables)
+    if "](" in line:
+        line = replace_link_wrap(line, name)
+    if "{{< copyable " in line:
+        line = copyable_snippet_pattern.sub("", line)
+    return line
+
+
+# Transform a chapter in a single pass over its lines. Each line is prepared, cleaned of sticky header tags, given its anchor
+# from the link table if it is a heading, filtered by CustomContent and shifted to the chapter level before the next line is read.
+# `anchors` are the anchors of the headings of the chapter in the link table.
+def transform_chapter(chapter, name, level, variables, custom_content_platform, anchors=(), plan=DEFAULT_PLAN):
+    content_filter = CustomContentFilter(custom_content_platform, plan)
+    shifter = HeadingShifter(level)
+    lines = (prepare_line(line, name, variables) for line in chapter.split("\n"))
+    scanner = link_table.HeadingScanner()
+    anchors = iter(anchors)
+    separator = ""
+    for line in remove_sticky_header_table(lines):
+        heading = None
+        if line.startswith("#") or "``" in line or "~~" in line:
+            heading = scanner.heading(line)
+        if heading is not None:
+            # The custom ID is replaced by the anchor that is unique in the merged document.
+            hashes, title, _ = heading
+            anchor = next(anchors, None)
+            line = "%s %s {#%s}" % (hashes, title, anchor) if anchor else "%s %s" % (hashes, title)
+        shifter.feed(content_filter.feed(separator + line))
+        separator = "\n"
+    shifter.feed(content_filter.finish())
+    return shifter.finish()
+
+
+# Write the parts of doc.md as they are generated, separated by newlines, so only one chapter is in memory at a time.
+# If `media` is a set, the paths of the images that the parts reference are added to it.
+class DocWriter:
+
+    def __init__(self, fp, media=None):
+        self.fp = fp
+        self.first = True
+        self.media = media
+
+    # Called before the parts of each TOC entry.
+    def begin(self, type_, level, name):
+        pass
+
+    def append(self, part):
+        if not self.first:
+            self.fp.write("\n")
+        self.fp.write(part)
+        self.first = False
+        if self.media is not None:
+            self.media.update(media_bundle.find_media(part))
+
+
+# Write doc.md as shards, one for each top-level TOC entry, and a manifest of the shards for render_shards.py.
+# The shards joined in order are the same as doc.md. The anchors are unique in the whole document, so links between shards still resolve
+# when the shards are rendered into one PDF.
+class ShardWriter(DocWriter):
+
+    def __init__(self, directory, entry_file, custom_content_platform, plan, media=None):
+        super().__init__(None, media)
+        self.directory = directory
+        self.manifest = {"format": SHARD_MANIFEST_FORMAT, "toc": entry_file, "platform": custom_content_platform, "plan": plan, "shards": []}
+
+    def begin(self, type_, level, name):
+        if level == 1 or self.fp is None:
+            self.open_shard(name if level == 1 else "")
+        if type_ == "FILE":
+            self.manifest["shards"][-1]["files"].append(name)
+
+    def open_shard(self, title):
+        self.close_shard()
+        filename = "%03d.md" % (len(self.manifest["shards"]) + 1)
+        self.fp = open(os.path.join(self.directory, filename), "w")
+        self.manifest["shards"].append({"file": filename, "title": title, "files": []})
+
+    def close_shard(self):
+        if self.fp is not None:
+            self.manifest["shards"][-1]["bytes"] = self.fp.tell()
+            self.fp.close()
+            self.fp = None
+
+    def close(self):
+        self.close_shard()
+        with open(os.path.join(self.directory, SHARD_MANIFEST), "w", encoding="utf-8") as fp:
+            json.dump(self.manifest, fp, indent=1)
+            fp.write("\n")
+
+
+# Set the link table that all chapters share. It runs in each worker process.
+def init_worker(table):
+    global anchor_table
+    anchor_table = table
+
+
+# Return (chapter, None, lookups, timing), or (None, error message, None, timing) so that the errors are printed in TOC order.
+# `lookups` are the link lookups that the chapter made, for the chapter cache. `timing` is (read seconds, transform seconds, characters).
+def transform_file(task):
+    global anchor_table
+    name, level, variables, custom_content_platform, plan, anchors = task
+    table = anchor_table
+    anchor_table = RecordingTable(table)
+    read_seconds, size = 0.0, 0
+    start = time.perf_counter()
+    try:
+        with open(name) as fp:
+            text = fp.read()
+        read_seconds, size = time.perf_counter() - start, len(text)
+        start = time.perf_counter()
+        chapter = transform_chapter(text, name, level, variables, custom_content_platform, anchors, plan)
+        return chapter, None, anchor_table.lookups, (read_seconds, time.perf_counter() - start, size)
+    except Exception as e:
+        return None, str(e), None, (read_seconds, 0.0, size)
+    finally:
+        anchor_table = table
 
-# remove <StickyHeaderTable> / </StickyHeaderTable> tags for PDF output
-sticky_header_table_pattern = re.compile(r'^\s*</?StickyHeaderTable\s*/?>\s*$')
 
-def remove_sticky_header_table(text):
-    lines = text.split('\n')
-    result = []
-    i = 0
-    while i < len(lines):
-        if sticky_header_table_pattern.match(lines[i]):
-            prev_blank = len(result) > 0 and result[-1].strip() == ''
-            next_blank = i + 1 < len(lines) and lines[i + 1].strip() == ''
-            if prev_blank and next_blank:
-                i += 2
+# stage 3, concat files
+# Each chapter only depends on the link table of stage 2, so the chapters are transformed on `jobs` worker processes and written in TOC order.
+# With `cache`, only the chapters that are not in the chapter cache are transformed. `sources` are the (content hash, CustomContent tags)
+# of the chapters from build_link_table(). If `timings` is a list, (file, read seconds, transform seconds, characters) of each transformed
+# chapter is appended to it, for merge_benchmark.py.
+def concat_files(followups, writer, variables, custom_content_platform, table, headings, jobs=1, plan=DEFAULT_PLAN, cache=None,
+                 sources=None, timings=None):
+    files = [(level, name) for type_, level, name in followups if type_ == "FILE"]
+    cached = []  # (cached chapter or None, cache key or None) of each chapter
+    tasks = []
+    if cache is not None:
+        variables_hash = chapter_cache.variables_hash(variables)
+    for index, ((level, name), anchors) in enumerate(zip(files, headings)):
+        chapter, key = None, None
+        if cache is not None and sources[index][0] is not None:
+            digest, tags, _ = sources[index]
+            key = (digest, (variables_hash, filter_signature(tags, custom_content_platform, plan), level, anchors))
+            chapter = cache.chapter(key[0], key[1], table)
+        cached.append((chapter, key))
+        if chapter is None:
+            tasks.append((name, level, variables, custom_content_platform, plan, anchors))
+    chapters = file_runner.imap_files(transform_file, tasks, jobs, init_worker, (table,))
+    cached = iter(cached)
+    for type_, level, name in followups:
+        writer.begin(type_, level, name)
+        if type_ == "TOC":
+            writer.append("\n{} {}\n".format("#" * level, name))
+        elif type_ == "RAW":
+            writer.append(name)
+        elif type_ == "FILE":
+            chapter, key = next(cached)
+            error = None
+            if chapter is None:
+                chapter, error, lookups, timing = next(chapters)
+                if timings is not None:
+                    timings.append((name,) + timing)
+                if key is not None and error is None:
+                    cache.put_chapter(key[0], key[1], lookups, chapter)
+            if error is None:
+                writer.append(chapter)
+                writer.append("")  # add an empty line
             else:
-                i += 1
-        else:
-            result.append(lines[i])
-            i += 1
-    return '\n'.join(result)
+                print(error)
+                print("generate file error: ignore!")
 
 
-# remove copyable snippet code
-def remove_copyable(match):
-    return ""
+# The multi-output build: every TOC file for every platform and plan in one run.
+# Each source file is read and scanned once for all outputs. The chapters of a file are transformed once for each distinct
+# (level, anchors, CustomContent decisions), and a chapter is shared by another TOC if its links resolve the same in that TOC.
 
-variables = load_variables()
 
-# stage 3, concat files
-for type_, level, name in followups:
-    if type_ == "TOC":
-        contents.append("\n{} {}\n".format("#" * level, name))
-    elif type_ == "RAW":
-        contents.append(name)
-    elif type_ == "FILE":
-        try:
-            with open(name) as fp:
-                chapter = fp.read()
-                chapter = replace_variables(chapter, variables)
-                chapter = replace_link_wrap(chapter, name)
-                chapter = copyable_snippet_pattern.sub(remove_copyable, chapter)
-                chapter = remove_sticky_header_table(chapter)
-                chapter = extract_custom_ids_and_clean(chapter)
-                chapter = replace_custom_id_links(chapter)
-                # This block is to filter <CustomContent paltform="xxx"> xxx </CustomContent>
+# Return the text, the source anchors, the content hash, the opening CustomContent tags and the unresolved variables of a source file,
+# and the error message if it cannot be read.
+def scan_source(task):
+    name, variables = task
+    try:
+        with open(name) as fp:
+            text = fp.read()
+    except Exception as e:
+        return None, [], None, [], [], str(e)
+    return (text,) + scan_chapter(text, variables) + (None,)
+
+
+link_tables = {}  # TOC file: link table, in the workers of the multi-output build
+
+
+def init_build_worker(tables):
+    global link_tables
+    link_tables = tables
+
+
+# Transform the variants of one source file. A variant is (TOC file, level, anchors, filter signature, platform, plan).
+# Return the distinct chapters, the link lookups of each chapter, and for each variant the index of its chapter or its error message.
+def transform_variants(task):
+    global anchor_table
+    name, text, variables, variants = task
+    chapters = []
+    chapter_lookups = []
+    results = []
+    done = {}  # (level, anchors, signature): [index]
+    saved_table = anchor_table
+    try:
+        for toc, level, anchors, signature, custom_content_platform, plan in variants:
+            table = link_tables[toc]
+            candidates = done.setdefault((level, anchors, signature), [])
+            for index in candidates:
+                if all(table.resolve(*key) == value for key, value in chapter_lookups[index].items()):
+                    results.append((index, None))
+                    break
+            else:
+                anchor_table = RecordingTable(table)
                 try:
-                    custom_content_platform = sys.argv[3]
-                except IndexError:
-                    custom_content_platform = "tidb"
-                # print("platform: ", custom_content_platform)
-                if custom_content_platform == "tidb":
-                    # print("removing custom content: tidb-cloud")
-                    # Cloud specified content should not render in tidb pdf
-                    chapter = custom_content_tidb_cloud.sub(lambda x: "", chapter)
-                elif custom_content_platform == "tidb-cloud":
-                    # print("removing custom content: tidb")
-                    # Tidb Specified content should not render in tidb-cloud pdf
-                    chapter = custom_content_tidb.sub(lambda x: "", chapter)
-
-                # Filter CustomContent by plan attribute, only keep content with "dedicated" in plan
-                def filter_by_plan(match):
-                    plan_value = match.group(1)  # Extract plan attribute value
-                    # Split by comma and check if "dedicated" is in the list
-                    plans = [p.strip() for p in plan_value.split(',')]
-                    if 'dedicated' in plans:
-                        return match.group(0)  # Keep the content
-                    else:
-                        return ""  # Remove the content
-
-                chapter = custom_content_with_plan.sub(filter_by_plan, chapter)
-
-                # fix heading level
-                diff_level = level - heading_patthern.findall(chapter)[0].count("#")
-
-                chapter = heading_patthern.sub(
-                    replace_heading_func(diff_level), chapter
-                )
-                contents.append(chapter)
-                contents.append("")  # add an empty line
-        except Exception as e:
-            print(e)
-            print("generate file error: ignore!")
-
-# stage 4, generage final doc.md
-try:
-    target_doc_file = sys.argv[2]
-except IndexError:
-    target_doc_file = "doc.md"
-with open(target_doc_file, "w") as fp:
-    fp.write("\n".join(contents))
+                    chapters.append(transform_chapter(text, name, level, variables, custom_content_platform, anchors, plan))
+                except Exception as e:
+                    results.append((None, str(e)))
+                    continue
+                chapter_lookups.append(anchor_table.lookups)
+                candidates.append(len(chapters) - 1)
+                results.append((len(chapters) - 1, None))
+    finally:
+        anchor_table = saved_table
+    return chapters, chapter_lookups, results
+
+
+# Write `doc.md` for every TOC file, platform and plan to `output_dir` as <TOC name>.<platform>.<plan>.md, and return the paths.
+# With `cache`, only the chapters that are not in the chapter cache are transformed.
+def build_all(toc_files, platforms, plans, output_dir, variables, jobs=1, cache=None, strict_variables=False):
+    tocs = [(toc, parse_toc(toc)) for toc in toc_files]
+    names = []
+    for toc, followups in tocs:
+        names.extend(name for type_, level, name in followups if type_ == "FILE")
+    names = list(dict.fromkeys(names))
+    sources = dict(zip(names, file_runner.imap_files(scan_source, [(name, variables) for name in names], jobs)))
+    if strict_variables:
+        check_unresolved(names, (sources[name][4] for name in names))
+
+    tables = {}
+    variants = {name: {} for name in names}  # name: {variant: (index in the variant list, platform, plan)}
+    outputs = []
+    for toc, followups in tocs:
+        files = [(level, name) for type_, level, name in followups if type_ == "FILE"]
+        table, headings = fill_link_table([name for level, name in files], (sources[name][1] for level, name in files))
+        tables[toc] = table
+        for custom_content_platform in platforms:
+            for plan in plans:
+                chapters = []
+                for (level, name), anchors in zip(files, headings):
+                    signature = filter_signature(sources[name][3], custom_content_platform, plan)
+                    variant = (toc, level, tuple(anchors), signature)
+                    if variant not in variants[name]:
+                        variants[name][variant] = (len(variants[name]), custom_content_platform, plan)
+                    chapters.append((name, variants[name][variant][0]))
+                outputs.append((toc, followups, custom_content_platform, plan, chapters))
+
+    variables_hash = chapter_cache.variables_hash(variables)
+    results = {}  # name: [(chapter, error)] of each variant
+    tasks = []
+    for name in names:
+        text, _, digest, _, _, error = sources[name]
+        results[name] = [(None, error)] * len(variants[name])
+        if error is not None:
+            continue
+        todo = []
+        for variant, (index, custom_content_platform, plan) in variants[name].items():
+            toc, level, anchors, signature = variant
+            chapter = None
+            if cache is not None:
+                chapter = cache.chapter(digest, (variables_hash, signature, level, anchors), tables[toc])
+            if chapter is None:
+                todo.append((index, variant + (custom_content_platform, plan)))
+            else:
+                results[name][index] = (chapter, None)
+        if todo:
+            tasks.append((name, text, variables, todo))
+
+    transform_count = 0
+    worker_tasks = [(name, text, variables, [variant for _, variant in todo]) for name, text, variables, todo in tasks]
+    transformed = file_runner.imap_files(transform_variants, worker_tasks, jobs, init_build_worker, (tables,))
+    for (name, _, _, todo), (chapters, chapter_lookups, file_results) in zip(tasks, transformed):
+        transform_count += len(chapters)
+        for (index, variant), (chapter_index, error) in zip(todo, file_results):
+            if error is not None:
+                results[name][index] = (None, error)
+                continue
+            results[name][index] = (chapters[chapter_index], None)
+            if cache is not None:
+                toc, level, anchors, signature = variant[:4]
+                cache.put_chapter(sources[name][2], (variables_hash, signature, level, anchors), chapter_lookups[chapter_index],
+                                  chapters[chapter_index])
+
+    paths = []
+    printed = set()
+    for toc, followups, custom_content_platform, plan, chapters in outputs:
+        path = os.path.join(output_dir, "%s.%s.%s.md" % (os.path.splitext(os.path.basename(toc))[0], custom_content_platform, plan))
+        chapters = iter(chapters)
+        with open(path, "w") as fp:
+            writer = DocWriter(fp)
+            for type_, level, name in followups:
+                if type_ == "TOC":
+                    writer.append("\n{} {}\n".format("#" * level, name))
+                elif type_ == "RAW":
+                    writer.append(name)
+                elif type_ == "FILE":
+                    name, variant = next(chapters)
+                    chapter, error = results[name][variant]
+                    if error is None:
+                        writer.append(chapter)
+                        writer.append("")  # add an empty line
+                    elif (name, error) not in printed:
+                        printed.add((name, error))
+                        print("%s: %s" % (name, error))
+                        print("generate file error: ignore!")
+        paths.append(path)
+
+    chapter_count = sum(len(output[4]) for output in outputs)
+    print("Merged %d outputs from %d source files: %d chapters, %d transformed." % (len(paths), len(names), chapter_count, transform_count),
+          file=sys.stderr)
+    return paths
+
+
+# Split a comma-separated option value.
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the Markdown files of a TOC into one Markdown file for the PDF build.")
+    parser.add_argument("entry_file", nargs="?", default="TOC.md", help="the TOC file. Default: %(default)s")
+    parser.add_argument("target_doc_file", nargs="?", default="doc.md", help="the merged file to write. Default: %(default)s")
+    parser.add_argument("custom_content_platform", nargs="?", default="tidb", help="tidb or tidb-cloud. Default: %(default)s")
+    parser.add_argument("--plan", default=DEFAULT_PLAN, choices=PLANS,
+                        help="keep the <CustomContent plan=...> blocks of this plan. Default: %(default)s")
+    parser.add_argument("--output-dir", metavar="DIR",
+                        help="instead of one doc.md, write one merged file for each TOC file, platform and plan to DIR, "
+                             "as <TOC name>.<platform>.<plan>.md, reading each source file only once")
+    parser.add_argument("--shards", metavar="DIR",
+                        help="instead of doc.md, write one shard for each top-level TOC entry and a manifest to DIR, "
+                             "to render the PDF in parallel with render_shards.py")
+    parser.add_argument("--media-manifest", metavar="PATH",
+                        help="also write the images that the merged document references to this JSON file, for media_bundle.py")
+    parser.add_argument("--tocs", help="with --output-dir, comma-separated TOC files. Default: all TOC*.md files")
+    parser.add_argument("--platforms", default=",".join(PLATFORMS), help="with --output-dir, comma-separated platforms. Default: %(default)s")
+    parser.add_argument("--plans", default=",".join(PLANS), help="with --output-dir, comma-separated plans. Default: %(default)s")
+    parser.add_argument("--strict-variables", action="store_true",
+                        help="exit with 1 before writing anything if a chapter has a variable that is not in variables.json, "
+                             "instead of keeping the {{{ .variable }}} placeholder")
+    parser.add_argument("--cache", metavar="PATH", default=os.environ.get("DOCS_MERGE_CACHE"),
+                        help="reuse the transformed chapters stored in this cache file for unchanged chapters. Default: $DOCS_MERGE_CACHE")
+    parser.add_argument("--cache-size", type=int, default=chapter_cache.DEFAULT_MAX_ENTRIES,
+                        help="maximum number of cache entries to keep. Default: %(default)s")
+    file_runner.add_jobs_argument(parser)
+    args = parser.parse_args()
+    if args.output_dir and (args.shards or args.media_manifest):
+        parser.error("--shards and --media-manifest cannot be used with --output-dir")
+    entry_file = args.entry_file
+    target_doc_file = args.target_doc_file
+    custom_content_platform = args.custom_content_platform
+
+    variables = load_variables()
+    cache = chapter_cache.ChapterCache.load(args.cache, args.cache_size) if args.cache else None
+    if args.output_dir:
+        toc_files = split_list(args.tocs) if args.tocs else sorted(glob.glob("TOC*.md"))
+        os.makedirs(args.output_dir, exist_ok=True)
+        build_all(toc_files, split_list(args.platforms), split_list(args.plans), args.output_dir, variables, args.jobs, cache,
+                  args.strict_variables)
+    else:
+        followups = parse_toc(entry_file)
+        table, headings, sources = build_link_table(followups, variables, args.jobs)
+        if args.strict_variables:
+            check_unresolved([name for type_, level, name in followups if type_ == "FILE"], (source[2] for source in sources))
+
+        # stage 4, generage final doc.md
+        media = set() if args.media_manifest else None
+        if args.shards:
+            os.makedirs(args.shards, exist_ok=True)
+            writer = ShardWriter(args.shards, entry_file, custom_content_platform, args.plan, media)
+            try:
+                concat_files(followups, writer, variables, custom_content_platform, table, headings, args.jobs, args.plan, cache, sources)
+            finally:
+                writer.close()
+        else:
+            with open(target_doc_file, "w") as fp:
+                concat_files(followups, DocWriter(fp, media), variables, custom_content_platform, table, headings, args.jobs, args.plan, cache,
+                             sources)
+        if media is not None:
+            manifest = media_bundle.write_manifest(args.media_manifest, media,
+                                                   {"toc": entry_file, "platform": custom_content_platform, "plan": args.plan})
+            print("Referenced %d images (%.1f MB), %d missing." % (len(manifest["media"]), sum(entry["bytes"] for entry in manifest["media"]) / 1e6,
+                                                                  len(manifest["missing"])), file=sys.stderr)
+    if cache is not None:
+        cache.save()
+        print("Chapter cache: %d hits, %d misses." % (cache.hits, cache.misses), file=sys.stderr)
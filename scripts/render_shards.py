@@ -0,0 +1,142 @@
+# This script renders the shards of `merge_by_toc.py --shards DIR` into one PDF, the same as `generate_pdf.sh` renders doc.md.
+# Pandoc converts the shards to LaTeX fragments on `--jobs` worker processes, which is the slow part of the single-file build.
+# The fragments are then included in one LaTeX document made from templates/template.tex with the options of `generate_pdf.sh`, and
+# xelatex renders it once, so the section numbers, the table of contents and the links between shards are the same as in doc.md.
+# Usage: python3 scripts/merge_by_toc.py TOC.md doc.md tidb --shards shards
+#        python3 scripts/render_shards.py shards [-j N] [-o output.pdf] [-V key=value ...] [--tex-only]
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import file_runner
+
+MAIN_TEX = "doc.tex"
+BODY_PLACEHOLDER = "RENDER-SHARDS-BODY"
+# The same options and variables as generate_pdf.sh.
+PANDOC_OPTIONS = ["--smart", "--columns=80", "--listings"]
+MAIN_OPTIONS = ["-N", "--toc", "--template=templates/template.tex", "--include-in-header=templates/deeplist.tex"]
+VARIABLES = {
+    "title": "TiDB Documentation",
+    "author": "PingCAP Inc.",
+    "CJKmainfont": "WenQuanYi Micro Hei",
+    "fontsize": "12pt",
+    "geometry": "margin=1in",
+    "include-after": "\\input{templates/copyright.tex}",
+}
+# Pandoc sets these template variables when the document has such content. The main document has no content of its own, so they are set
+# for the packages that the fragments can need.
+CONTENT_VARIABLES = ["graphics", "tables", "strikeout", "verbatim-in-note"]
+LATEX_RUNS = 3
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+# Convert one shard to a LaTeX fragment. Return (seconds, error message or None).
+def convert_shard(task):
+    pandoc, source, target = task
+    start = time.perf_counter()
+    p = subprocess.run([pandoc] + PANDOC_OPTIONS + ["-t", "latex", source, "-o", target], capture_output=True)
+    error = None
+    if p.returncode != 0:
+        error = "%s: pandoc exited with %d\n%s" % (source, p.returncode, p.stderr.decode("utf-8", "replace"))
+    return time.perf_counter() - start, error
+
+
+def variable_options(variables):
+    options = []
+    for key, value in variables.items():
+        options.extend(["-V", "%s=%s" % (key, value) if value is not None else key])
+    return options
+
+
+# Write the main LaTeX document: the template with the same options as generate_pdf.sh, and the fragments as its body.
+def write_main(pandoc, directory, fragments, variables):
+    p = subprocess.run([pandoc] + PANDOC_OPTIONS + MAIN_OPTIONS + variable_options(variables) + ["-s", "-f", "markdown", "-t", "latex"],
+                       input=(BODY_PLACEHOLDER + "\n").encode("utf-8"), capture_output=True)
+    if p.returncode != 0:
+        raise SystemExit("pandoc exited with %d\n%s" % (p.returncode, p.stderr.decode("utf-8", "replace")))
+    main = p.stdout.decode("utf-8")
+    if main.count(BODY_PLACEHOLDER) != 1:
+        raise SystemExit("The template has no body for the shards.")
+    body = "\n".join("\\input{%s}" % os.path.relpath(fragment).replace(os.sep, "/") for fragment in fragments)
+    path = os.path.join(directory, MAIN_TEX)
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(main.replace(BODY_PLACEHOLDER, body))
+    return path
+
+
+# Run xelatex in the docs root, where the templates and media are, until the table of contents and the references are settled.
+def run_latex(xelatex, directory, path):
+    log_path = os.path.splitext(path)[0] + ".log"
+    for run in range(LATEX_RUNS):
+        p = subprocess.run([xelatex, "-interaction=nonstopmode", "-halt-on-error", "-output-directory", directory, path],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if p.returncode != 0:
+            raise SystemExit("xelatex exited with %d. See %s" % (p.returncode, log_path))
+        with open(log_path, "r", encoding="utf-8", errors="replace") as fp:
+            log = fp.read()
+        # The first run writes the table of contents that the second run reads.
+        if run > 0 and "Rerun to get" not in log:
+            break
+    return os.path.splitext(path)[0] + ".pdf"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Render the shards of merge_by_toc.py --shards into one PDF.")
+    parser.add_argument("directory", help="the shard directory with manifest.json")
+    parser.add_argument("-o", "--output", default="output.pdf", help="the PDF file to write. Default: %(default)s")
+    parser.add_argument("-V", "--variable", action="append", default=[], metavar="KEY=VALUE",
+                        help="set a template variable, as in pandoc. The defaults are those of generate_pdf.sh")
+    parser.add_argument("--tex-only", action="store_true", help="only write the LaTeX fragments and the main document doc.tex")
+    parser.add_argument("--pandoc", default="pandoc", help="the pandoc command. Default: %(default)s")
+    parser.add_argument("--xelatex", default="xelatex", help="the xelatex command. Default: %(default)s")
+    file_runner.add_jobs_argument(parser, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    manifest = load_manifest(args.directory)
+    variables = dict(VARIABLES)
+    variables["date"] = time.strftime("%Y%m%d")
+    for name in CONTENT_VARIABLES:
+        variables[name] = None
+    for item in args.variable:
+        key, _, value = item.partition("=")
+        variables[key] = value if value else None
+
+    start = time.perf_counter()
+    shards = manifest["shards"]
+    fragments = [os.path.join(args.directory, os.path.splitext(shard["file"])[0] + ".tex") for shard in shards]
+    # The largest shards start first, so that they do not finish last on their own.
+    order = sorted(range(len(shards)), key=lambda i: shards[i].get("bytes", 0), reverse=True)
+    tasks = [(args.pandoc, os.path.join(args.directory, shards[i]["file"]), fragments[i]) for i in order]
+    results = list(file_runner.imap_files(convert_shard, tasks, args.jobs))
+    errors = [error for _, error in results if error is not None]
+    for error in errors:
+        print(error, file=sys.stderr)
+    serial = sum(seconds for seconds, _ in results)
+    print("Converted %d shards in %.2fs with %d jobs (pandoc time %.2fs)." % (len(shards), time.perf_counter() - start,
+                                                                              file_runner.resolve_jobs(args.jobs), serial), file=sys.stderr)
+    if errors:
+        return 1
+
+    path = write_main(args.pandoc, args.directory, fragments, variables)
+    if args.tex_only:
+        print("Wrote %s." % path, file=sys.stderr)
+        return 0
+    shutil.move(run_latex(args.xelatex, args.directory, path), args.output)
+    print("Wrote %s in %.2fs." % (args.output, time.perf_counter() - start), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+# This module reads and writes the tag index: the tag tree of each Markdown file, keyed by the git blob hash of the file content.
+# `check-tags.py --tag-index PATH` writes the index while it checks the tags. Other scripts can then look up the `<CustomContent>` blocks
+# and other tags of a file, with their attributes, byte offsets and nesting, instead of scanning the file again.
+# The index uses the file format of `lint_cache.py`, and its entries are outdated automatically when the tag rules change.
+#
+#     index = tag_index.load("tag-index.json")
+#     tree = tag_index.lookup(index, data)  # None if the content is not in the index
+#     for node, parents in tag_index.walk(tree):
+#         if node["name"] == "CustomContent" and node["attrs"].get("platform") == "tidb-cloud": ...
+
+import lint_cache
+
+TAG_TREE = "tag-tree"
+
+
+def load(path, max_entries=lint_cache.DEFAULT_MAX_ENTRIES):
+    return lint_cache.LintCache.load(path, max_entries)
+
+
+# Add the findings of the "tag-tree" rule for a file: the tag tree and the hash of the bytes it was built from, which is the key that
+# `lookup` uses. Call `index.save()` to write the index.
+def add(index, findings):
+    index.put(findings["blob"], TAG_TREE, findings["tree"])
+
+
+# Return the tag tree of the file content `data` (bytes), or None if it is not in the index.
+def lookup(index, data):
+    return index.get(lint_cache.blob_hash(data), TAG_TREE)
+
+
+# Yield (node, parent nodes) for every node of a tag tree in document order.
+def walk(tree, parents=()):
+    for node in tree:
+        yield node, parents
+        yield from walk(node["children"], parents + (node,))